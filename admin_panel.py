@@ -4,9 +4,15 @@ Powerful admin panel features
 """
 
 import sqlite3
+import asyncio
+import logging
+import time
 from datetime import datetime, timedelta
-from typing import List, Tuple
-from database import db_connect, now_iso
+from typing import Awaitable, Callable, List, Optional, Tuple
+from config import OWNER_ID
+from database import db_connect, db_read, now_iso, clear_role_cache, delete_project, get_all_stats, stat_increment, page_bounds
+
+logger = logging.getLogger(__name__)
 
 # =============================================================================
 # ADMIN MANAGEMENT
@@ -14,36 +20,39 @@ from database import db_connect, now_iso
 
 def add_admin(user_id: int) -> bool:
     """Add user as admin"""
+    conn = db_connect()
     try:
-        conn = db_connect()
-        c = conn.cursor()
-        c.execute("INSERT OR IGNORE INTO admins(user_id) VALUES(?)", (user_id,))
-        conn.commit()
-        conn.close()
-        return True
-    except:
+        with conn:
+            c = conn.cursor()
+            c.execute("INSERT OR IGNORE INTO admins(user_id) VALUES(?)", (user_id,))
+    except sqlite3.Error as e:
+        logger.warning("add_admin(%s) failed: %s", user_id, e)
         return False
+    
+    clear_role_cache(user_id)
+    invalidate_analytics()
+    return True
 
 def remove_admin(user_id: int) -> bool:
     """Remove admin privileges"""
+    conn = db_connect()
     try:
-        conn = db_connect()
-        c = conn.cursor()
-        c.execute("DELETE FROM admins WHERE user_id=?", (user_id,))
-        conn.commit()
-        conn.close()
-        return True
-    except:
+        with conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM admins WHERE user_id=?", (user_id,))
+    except sqlite3.Error as e:
+        logger.warning("remove_admin(%s) failed: %s", user_id, e)
         return False
+    
+    clear_role_cache(user_id)
+    invalidate_analytics()
+    return True
 
 def list_admins() -> List[int]:
     """Get list of all admins"""
     conn = db_connect()
     c = conn.cursor()
-    c.execute("SELECT user_id FROM admins")
-    admins = [row[0] for row in c.fetchall()]
-    conn.close()
-    return admins
+    return [uid for (uid,) in c.execute("SELECT user_id FROM admins")]
 
 # =============================================================================
 # BAN MANAGEMENT
@@ -51,30 +60,40 @@ def list_admins() -> List[int]:
 
 def ban_user(user_id: int, reason: str, banned_by: int) -> bool:
     """Ban a user"""
+    conn = db_connect()
     try:
-        conn = db_connect()
-        c = conn.cursor()
-        c.execute("""
-            INSERT OR REPLACE INTO banned_users(user_id, banned_date, reason, banned_by)
-            VALUES(?, ?, ?, ?)
-        """, (user_id, now_iso(), reason, banned_by))
-        conn.commit()
-        conn.close()
-        return True
-    except:
+        with conn:
+            c = conn.cursor()
+            c.execute("""
+                INSERT INTO banned_users(user_id, banned_date, reason, banned_by)
+                VALUES(?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    banned_date=excluded.banned_date,
+                    reason=excluded.reason,
+                    banned_by=excluded.banned_by
+            """, (user_id, now_iso(), reason, banned_by))
+    except sqlite3.Error as e:
+        logger.warning("ban_user(%s) failed: %s", user_id, e)
         return False
+    
+    clear_role_cache(user_id)
+    invalidate_analytics()
+    return True
 
 def unban_user(user_id: int) -> bool:
     """Unban a user"""
+    conn = db_connect()
     try:
-        conn = db_connect()
-        c = conn.cursor()
-        c.execute("DELETE FROM banned_users WHERE user_id=?", (user_id,))
-        conn.commit()
-        conn.close()
-        return True
-    except:
+        with conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM banned_users WHERE user_id=?", (user_id,))
+    except sqlite3.Error as e:
+        logger.warning("unban_user(%s) failed: %s", user_id, e)
         return False
+    
+    clear_role_cache(user_id)
+    invalidate_analytics()
+    return True
 
 def list_banned() -> List[Tuple]:
     """Get list of banned users"""
@@ -82,7 +101,6 @@ def list_banned() -> List[Tuple]:
     c = conn.cursor()
     c.execute("SELECT user_id, banned_date, reason FROM banned_users")
     banned = c.fetchall()
-    conn.close()
     return banned
 
 # =============================================================================
@@ -91,31 +109,41 @@ def list_banned() -> List[Tuple]:
 
 def add_premium(user_id: int, days: int, granted_by: int) -> bool:
     """Grant premium subscription"""
+    conn = db_connect()
     try:
         expiry = (datetime.now() + timedelta(days=days)).isoformat(timespec='seconds')
-        conn = db_connect()
-        c = conn.cursor()
-        c.execute("""
-            INSERT OR REPLACE INTO subscriptions(user_id, expiry, granted_by, granted_at)
-            VALUES(?, ?, ?, ?)
-        """, (user_id, expiry, granted_by, now_iso()))
-        conn.commit()
-        conn.close()
-        return True
-    except:
+        with conn:
+            c = conn.cursor()
+            c.execute("""
+                INSERT INTO subscriptions(user_id, expiry, granted_by, granted_at)
+                VALUES(?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    expiry=excluded.expiry,
+                    granted_by=excluded.granted_by,
+                    granted_at=excluded.granted_at
+            """, (user_id, expiry, granted_by, now_iso()))
+    except (sqlite3.Error, OverflowError) as e:
+        logger.warning("add_premium(%s) failed: %s", user_id, e)
         return False
+    
+    clear_role_cache(user_id)
+    invalidate_analytics()
+    return True
 
 def remove_premium(user_id: int) -> bool:
     """Remove premium subscription"""
+    conn = db_connect()
     try:
-        conn = db_connect()
-        c = conn.cursor()
-        c.execute("DELETE FROM subscriptions WHERE user_id=?", (user_id,))
-        conn.commit()
-        conn.close()
-        return True
-    except:
+        with conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM subscriptions WHERE user_id=?", (user_id,))
+    except sqlite3.Error as e:
+        logger.warning("remove_premium(%s) failed: %s", user_id, e)
         return False
+    
+    clear_role_cache(user_id)
+    invalidate_analytics()
+    return True
 
 def list_premium() -> List[Tuple]:
     """Get list of premium users"""
@@ -123,13 +151,22 @@ def list_premium() -> List[Tuple]:
     c = conn.cursor()
     c.execute("SELECT user_id, expiry FROM subscriptions")
     premium = c.fetchall()
-    conn.close()
     return premium
 
 # =============================================================================
 # USER ANALYTICS
 # =============================================================================
 
+# Activity thresholds are snapped to this many minutes so repeated queries
+# within the window bind identical parameters
+ACTIVITY_BUCKET_MINUTES = 5
+
+def activity_threshold(hours: int) -> str:
+    """Get ISO timestamp N hours ago, rounded down to the activity bucket"""
+    t = datetime.now() - timedelta(hours=hours)
+    t = t.replace(minute=t.minute - t.minute % ACTIVITY_BUCKET_MINUTES, second=0, microsecond=0)
+    return t.isoformat()
+
 def get_user_list(limit: int = 50) -> List[Tuple]:
     """Get list of users"""
     conn = db_connect()
@@ -141,26 +178,36 @@ def get_user_list(limit: int = 50) -> List[Tuple]:
         LIMIT ?
     """, (limit,))
     users = c.fetchall()
-    conn.close()
     return users
 
+def get_user_list_page(page: int, per_page: int = 10) -> Tuple[List[Tuple], int, int, int]:
+    """One page of users, most recently active first; returns (rows, page, pages, total)"""
+    total = get_user_count()
+    page, pages, offset = page_bounds(total, page, per_page)
+    conn = db_connect()
+    rows = conn.execute("""
+        SELECT user_id, username, full_name, join_date, last_active
+        FROM users
+        ORDER BY last_active DESC, user_id
+        LIMIT ? OFFSET ?
+    """, (per_page, offset)).fetchall()
+    return rows, page, pages, total
+
 def get_user_count() -> int:
     """Get total user count"""
     conn = db_connect()
     c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM users")
-    count = c.fetchone()[0]
-    conn.close()
-    return count
+    c.execute("SELECT stat_value FROM bot_stats WHERE stat_name='count_users'")
+    row = c.fetchone()
+    return row[0] if row else 0
 
 def get_active_users(hours: int = 24) -> int:
     """Get count of users active in last N hours"""
-    threshold = (datetime.now() - timedelta(hours=hours)).isoformat()
+    threshold = activity_threshold(hours)
     conn = db_connect()
     c = conn.cursor()
     c.execute("SELECT COUNT(*) FROM users WHERE last_active > ?", (threshold,))
     count = c.fetchone()[0]
-    conn.close()
     return count
 
 def get_bot_analytics() -> dict:
@@ -168,135 +215,238 @@ def get_bot_analytics() -> dict:
     conn = db_connect()
     c = conn.cursor()
     
-    # Total users
-    c.execute("SELECT COUNT(*) FROM users")
-    total_users = c.fetchone()[0]
-    
-    # Active users (24h)
-    threshold_24h = (datetime.now() - timedelta(hours=24)).isoformat()
-    c.execute("SELECT COUNT(*) FROM users WHERE last_active > ?", (threshold_24h,))
-    active_24h = c.fetchone()[0]
-    
-    # Total projects
-    c.execute("SELECT COUNT(*) FROM projects")
-    total_projects = c.fetchone()[0]
-    
-    # Total files
-    c.execute("SELECT COUNT(*) FROM files")
-    total_files = c.fetchone()[0]
-    
-    # Premium users
+    threshold_24h = activity_threshold(24)
     now = datetime.now().isoformat()
-    c.execute("SELECT COUNT(*) FROM subscriptions WHERE expiry > ?", (now,))
-    premium_count = c.fetchone()[0]
-    
-    # Banned users
-    c.execute("SELECT COUNT(*) FROM banned_users")
-    banned_count = c.fetchone()[0]
     
-    # Admins
-    c.execute("SELECT COUNT(*) FROM admins")
-    admin_count = c.fetchone()[0]
-    
-    # Statistics
-    c.execute("SELECT stat_name, stat_value FROM bot_stats")
-    stats = {row[0]: row[1] for row in c.fetchall()}
+    # Time-dependent counters in one statement
+    c.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM users WHERE last_active > ?),
+            (SELECT COUNT(*) FROM subscriptions WHERE expiry > ?)
+    """, (threshold_24h, now))
+    active_24h, premium_count = c.fetchone()
     
-    conn.close()
+    # Statistics, including the trigger-maintained row counters
+    stats = get_all_stats()
     
     return {
-        'total_users': total_users,
+        'total_users': stats.get('count_users', 0),
         'active_24h': active_24h,
-        'total_projects': total_projects,
-        'total_files': total_files,
+        'total_projects': stats.get('count_projects', 0),
+        'total_files': stats.get('count_files', 0),
         'premium_users': premium_count,
-        'banned_users': banned_count,
-        'admins': admin_count,
+        'banned_users': stats.get('count_banned', 0),
+        'admins': stats.get('count_admins', 0),
         'stats': stats
     }
 
-def search_user(query: str) -> List[Tuple]:
-    """Search users by ID, username or name"""
-    conn = db_connect()
-    c = conn.cursor()
-    
+def _search_filter(query: str) -> Optional[Tuple[str, tuple]]:
+    """Build the users WHERE clause for an admin search query"""
     # Try as ID first
     try:
-        user_id = int(query)
-        c.execute("""
-            SELECT user_id, username, full_name, join_date, last_active
-            FROM users WHERE user_id=?
-        """, (user_id,))
-        result = c.fetchall()
-        conn.close()
-        return result
+        return "u.user_id = ?", (int(query),)
     except ValueError:
         pass
     
-    # Search by username/name
-    query_like = f"%{query}%"
-    c.execute("""
-        SELECT user_id, username, full_name, join_date, last_active
-        FROM users
-        WHERE username LIKE ? OR full_name LIKE ?
-        LIMIT 20
-    """, (query_like, query_like))
+    # Search by username/name: every word must prefix-match a name token
+    terms = query.split()
+    if not terms:
+        return None
+    match = " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+    return "u.user_id IN (SELECT rowid FROM users_fts WHERE users_fts MATCH ? LIMIT 20)", (match,)
+
+# Analytics are aggregate scans shared by the admin panel and the /stats
+# endpoint, so one result is reused for this many seconds
+ANALYTICS_CACHE_TTL = 15
+
+_analytics_cache: Optional[Tuple[dict, float]] = None
+
+def get_bot_analytics_cached() -> dict:
+    """Get bot analytics, reusing a recent result"""
+    global _analytics_cache
+    cached = _analytics_cache
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    
+    analytics = get_bot_analytics()
+    _analytics_cache = (analytics, time.monotonic() + ANALYTICS_CACHE_TTL)
+    return analytics
+
+def invalidate_analytics():
+    """Drop cached analytics after a role change"""
+    global _analytics_cache
+    _analytics_cache = None
+
+def search_user(query: str) -> List[Tuple]:
+    """Search users by ID, username or name"""
+    search = _search_filter(query)
+    if search is None:
+        return []
+    
+    where, params = search
+    conn = db_connect()
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT u.user_id, u.username, u.full_name, u.join_date, u.last_active
+        FROM users u
+        WHERE {where}
+    """, params)
     users = c.fetchall()
-    conn.close()
     return users
 
+def search_user_with_stats(query: str) -> List[Tuple]:
+    """
+    Search users and fetch their counters and roles in the same query
+    
+    Returns:
+        [(user_id, username, full_name, project_count, file_count,
+          is_admin, is_premium, is_banned)]
+    """
+    search = _search_filter(query)
+    if search is None:
+        return []
+    
+    where, params = search
+    conn = db_connect()
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT u.user_id, u.username, u.full_name,
+            (SELECT COUNT(*) FROM projects p WHERE p.user_id = u.user_id),
+            (SELECT COUNT(*) FROM files f WHERE f.user_id = u.user_id),
+            u.user_id = ? OR EXISTS(SELECT 1 FROM admins a WHERE a.user_id = u.user_id),
+            EXISTS(SELECT 1 FROM subscriptions s WHERE s.user_id = u.user_id AND s.expiry > ?),
+            EXISTS(SELECT 1 FROM banned_users b WHERE b.user_id = u.user_id)
+        FROM users u
+        WHERE {where}
+    """, (OWNER_ID, datetime.now().isoformat()) + params)
+    return [row[:5] + tuple(map(bool, row[5:])) for row in c.fetchall()]
+
 # =============================================================================
 # BROADCAST
 # =============================================================================
 
-async def broadcast_message(bot, message_text: str, target: str = "all", parse_mode: str = "HTML"):
+# Max number of send_message calls in flight at once
+BROADCAST_CONCURRENCY = 25
+# Recipients read from the database per batch
+BROADCAST_FETCH_SIZE = 1000
+# Sends started per second, kept under Telegram's ~30 messages/s bot limit
+BROADCAST_RATE = 25
+# Times a send is retried after Telegram answers with a flood-wait
+BROADCAST_RETRIES = 3
+# Deliveries between progress callbacks
+BROADCAST_PROGRESS_EVERY = 50
+
+# Recipient filter and parameter builder per broadcast target; recipients
+# are read in user_id order, one keyset page at a time
+_BROADCAST_SQL = {
+    "all": (
+        "1",
+        lambda: ()
+    ),
+    "premium": (
+        "user_id IN (SELECT user_id FROM subscriptions WHERE expiry > ?)",
+        lambda: (datetime.now().isoformat(),)
+    ),
+    "active_24h": (
+        "last_active > ?",
+        lambda: (activity_threshold(24),)
+    ),
+}
+# The admin panel offers "active" as the target name
+_BROADCAST_SQL["active"] = _BROADCAST_SQL["active_24h"]
+
+def _broadcast_recipients(where: str, params: tuple, after_id: int) -> List[int]:
+    """Next BROADCAST_FETCH_SIZE recipient IDs above after_id"""
+    conn = db_connect()
+    return [uid for (uid,) in conn.execute(
+        f"SELECT user_id FROM users WHERE ({where}) AND user_id > ? ORDER BY user_id LIMIT ?",
+        params + (after_id, BROADCAST_FETCH_SIZE)
+    )]
+
+async def broadcast_message(bot, message_text: str, target: str = "all", parse_mode: str = "HTML",
+                            on_progress: Optional[Callable[[int, int], Awaitable]] = None):
     """
     Broadcast message to users
     
     Args:
         bot: Bot instance
         message_text: Message to send
-        target: "all", "premium", or "active_24h"
+        target: "all", "premium", or "active_24h" (alias "active")
         parse_mode: Parse mode for message
+        on_progress: Awaited with (success, failed) every BROADCAST_PROGRESS_EVERY sends
     
     Returns:
         (success_count, fail_count)
     """
-    conn = db_connect()
-    c = conn.cursor()
-    
-    if target == "all":
-        c.execute("SELECT user_id FROM users")
-    elif target == "premium":
-        now = datetime.now().isoformat()
-        c.execute("""
-            SELECT u.user_id FROM users u
-            JOIN subscriptions s ON u.user_id = s.user_id
-            WHERE s.expiry > ?
-        """, (now,))
-    elif target == "active_24h":
-        threshold = (datetime.now() - timedelta(hours=24)).isoformat()
-        c.execute("SELECT user_id FROM users WHERE last_active > ?", (threshold,))
-    else:
-        conn.close()
+    if target not in _BROADCAST_SQL:
         return 0, 0
     
-    user_ids = [row[0] for row in c.fetchall()]
-    conn.close()
+    where, make_params = _BROADCAST_SQL[target]
+    params = make_params()
     
+    sem = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    next_slot = loop.time()
     success = 0
     failed = 0
+    reported = 0
+    
+    async def pace():
+        """Wait for the next send slot"""
+        nonlocal next_slot
+        now = loop.time()
+        slot = max(next_slot, now)
+        next_slot = slot + 1 / BROADCAST_RATE
+        if slot > now:
+            await asyncio.sleep(slot - now)
     
-    for user_id in user_ids:
-        try:
-            await bot.send_message(
-                user_id,
-                message_text,
-                parse_mode=parse_mode
-            )
+    async def send_one(user_id: int) -> bool:
+        async with sem:
+            for attempt in range(BROADCAST_RETRIES + 1):
+                await pace()
+                try:
+                    await bot.send_message(
+                        user_id,
+                        message_text,
+                        parse_mode=parse_mode
+                    )
+                    return True
+                except Exception as e:
+                    # Flood-wait errors say how long to back off
+                    retry_after = getattr(e, "retry_after", None)
+                    if not retry_after or attempt == BROADCAST_RETRIES:
+                        return False
+                    await asyncio.sleep(retry_after)
+            return False
+    
+    async def send_and_count(user_id: int):
+        nonlocal success, failed, reported
+        if await send_one(user_id):
             success += 1
-        except Exception:
+        else:
             failed += 1
+        
+        if on_progress and success + failed - reported >= BROADCAST_PROGRESS_EVERY:
+            reported = success + failed
+            try:
+                await on_progress(success, failed)
+            except Exception as e:
+                logger.debug("Broadcast progress update failed: %s", e)
+    
+    # Read recipients in batches instead of loading every user ID at once;
+    # each read finishes before its batch is sent, so no snapshot stays open
+    after_id = -1
+    while True:
+        recipients = await db_read(_broadcast_recipients, where, params, after_id)
+        if not recipients:
+            break
+        after_id = recipients[-1]
+        
+        await asyncio.gather(*(send_and_count(uid) for uid in recipients))
+    
+    # One buffered increment per broadcast, written by the next stats flush
+    stat_increment("total_broadcasts")
+    stat_increment("total_broadcast_messages", success)
     
     return success, failed
 
@@ -315,20 +465,13 @@ def get_all_projects(limit: int = 50) -> List[Tuple]:
         LIMIT ?
     """, (limit,))
     projects = c.fetchall()
-    conn.close()
     return projects
 
 def admin_delete_project(user_id: int, project_id: int) -> bool:
     """Delete any project (admin only)"""
     try:
-        conn = db_connect()
-        c = conn.cursor()
-        c.execute("DELETE FROM files WHERE user_id=? AND project_id=?", (user_id, project_id))
-        c.execute("DELETE FROM favorites WHERE user_id=? AND project_id=?", (user_id, project_id))
-        c.execute("DELETE FROM env_vars WHERE user_id=? AND project_id=?", (user_id, project_id))
-        c.execute("DELETE FROM projects WHERE user_id=? AND project_id=?", (user_id, project_id))
-        conn.commit()
-        conn.close()
-        return True
-    except:
-        return False
\ No newline at end of file
+        delete_project(user_id, project_id)
+    except sqlite3.Error as e:
+        logger.warning("admin_delete_project(%s, %s) failed: %s", user_id, project_id, e)
+        return False
+    return True
\ No newline at end of file
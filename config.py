@@ -4,7 +4,9 @@ Configuration file for Advanced Bot Hosting
 """
 
 import os
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
 
 # =============================================================================
 # BOT CONFIGURATION (Use environment variables for Render)
@@ -34,13 +36,23 @@ MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
 MAX_FILE_VIEW_CHARS = 4000
 LOG_TAIL_LINES = 80
 PAGINATION_PAGE_SIZE = 7
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes per chunk when saving uploaded files
+UPLOAD_PROGRESS_INTERVAL = 1.5  # Seconds between upload progress edits
 
 # =============================================================================
 # HOSTING SETTINGS
 # =============================================================================
 AUTO_RESTART_CHECK_INTERVAL = 3
 AUTO_RESTART_BACKOFF_SEC = 3
+MAX_CONCURRENT_INSTALLS = int(os.getenv("MAX_CONCURRENT_INSTALLS", "2"))  # pip/uv runs at once
+STATS_FLUSH_INTERVAL = 2  # Seconds between bot_stats counter flushes
+USERS_FLUSH_INTERVAL = 0.5  # Seconds between buffered ensure_user flushes
 WEB_SERVER_PORT = int(os.getenv("PORT", "5000"))  # Render uses PORT env var
+# Public base URL of the web server (e.g. Render's RENDER_EXTERNAL_URL);
+# when set, updates arrive by webhook instead of long polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Checked against Telegram's secret header
 
 # =============================================================================
 # PATHS (Render compatible - use /tmp for writable storage)
@@ -65,10 +77,14 @@ USERS_DIR.mkdir(exist_ok=True, parents=True)
 LOGS_DIR.mkdir(exist_ok=True, parents=True)
 
 # =============================================================================
-# TEMPLATES (keep same as before)
+# TEMPLATES
 # =============================================================================
-TEMPLATES = {
-    "telegram_echo": {
+# Template file bodies live in templates/<template_id>/ and are only read
+# when a template is installed (see template_files()).
+TEMPLATES_DIR = BASE_DIR / "templates"
+
+TEMPLATES = MappingProxyType({
+    "telegram_echo": MappingProxyType({
         "title": "🤖 Telegram Echo Bot",
         "category": "Telegram Bots",
         "difficulty": "Easy",
@@ -76,42 +92,10 @@ TEMPLATES = {
         "entry": "main.py",
         "lang": "py",
         "auto_restart": 1,
-        "files": {
-            "main.py": """# Telegram Echo Bot
-import asyncio
-from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import CommandStart
-
-TOKEN = "YOUR_BOT_TOKEN_HERE"
-
-bot = Bot(token=TOKEN)
-dp = Dispatcher()
-
-@dp.message(CommandStart())
-async def cmd_start(message: types.Message):
-    await message.answer(
-        "👋 <b>Hello!</b>\\n\\n"
-        "I'm an echo bot. Send me any text and I'll repeat it!",
-        parse_mode="HTML"
-    )
-
-@dp.message(F.text)
-async def echo_handler(message: types.Message):
-    await message.answer(message.text)
-
-async def main():
-    print("🚀 Bot started!")
-    await dp.start_polling(bot)
-
-if __name__ == "__main__":
-    asyncio.run(main())
-""",
-            "requirements.txt": "aiogram>=3.4.1\n",
-            "README.md": "# Echo Bot\\n\\nSimple Telegram bot that echoes messages.\\n"
-        }
-    },
+        "files": ("main.py", "requirements.txt", "README.md"),
+    }),
     
-    "telegram_menu": {
+    "telegram_menu": MappingProxyType({
         "title": "📱 Telegram Menu Bot",
         "category": "Telegram Bots",
         "difficulty": "Medium",
@@ -119,97 +103,27 @@ if __name__ == "__main__":
         "entry": "main.py",
         "lang": "py",
         "auto_restart": 1,
-        "files": {
-            "main.py": """# Telegram Menu Bot with FSM
-import asyncio
-from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import CommandStart
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-
-TOKEN = "YOUR_BOT_TOKEN_HERE"
-
-bot = Bot(token=TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
-
-class Form(StatesGroup):
-    name = State()
-    age = State()
-
-def main_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="ℹ️ About", callback_data="about")],
-        [InlineKeyboardButton(text="📝 Register", callback_data="register")],
-        [InlineKeyboardButton(text="❓ Help", callback_data="help")]
-    ])
-
-@dp.message(CommandStart())
-async def cmd_start(message: types.Message):
-    await message.answer(
-        "🎉 <b>Welcome to Menu Bot!</b>\\n\\n"
-        "Choose an option from the menu:",
-        reply_markup=main_menu(),
-        parse_mode="HTML"
-    )
-
-@dp.callback_query(F.data == "about")
-async def about_callback(call: types.CallbackQuery):
-    await call.message.edit_text(
-        "ℹ️ <b>About This Bot</b>\\n\\n"
-        "This is a demo menu bot with FSM support.",
-        reply_markup=main_menu(),
-        parse_mode="HTML"
-    )
-    await call.answer()
-
-@dp.callback_query(F.data == "register")
-async def register_callback(call: types.CallbackQuery, state: FSMContext):
-    await state.set_state(Form.name)
-    await call.message.edit_text("📝 Please send your name:")
-    await call.answer()
-
-@dp.message(Form.name)
-async def process_name(message: types.Message, state: FSMContext):
-    await state.update_data(name=message.text)
-    await state.set_state(Form.age)
-    await message.answer("📅 Now send your age:")
-
-@dp.message(Form.age)
-async def process_age(message: types.Message, state: FSMContext):
-    data = await state.get_data()
-    await state.clear()
-    await message.answer(
-        f"✅ <b>Registration Complete!</b>\\n\\n"
-        f"Name: {data['name']}\\n"
-        f"Age: {message.text}",
-        reply_markup=main_menu(),
-        parse_mode="HTML"
-    )
-
-@dp.callback_query(F.data == "help")
-async def help_callback(call: types.CallbackQuery):
-    await call.message.edit_text(
-        "❓ <b>Help</b>\\n\\n"
-        "Use /start to open the menu.\\n"
-        "Click buttons to navigate.",
-        reply_markup=main_menu(),
-        parse_mode="HTML"
-    )
-    await call.answer()
-
-async def main():
-    print("🚀 Menu bot started!")
-    await dp.start_polling(bot)
-
-if __name__ == "__main__":
-    asyncio.run(main())
-""",
-            "requirements.txt": "aiogram>=3.4.1\n",
-            "README.md": "# Menu Bot\\n\\nTelegram bot with inline menus and FSM.\\n"
-        }
-    },
-}
-
-TEMPLATE_CATEGORIES = sorted(set(t["category"] for t in TEMPLATES.values()))
+        "files": ("main.py", "requirements.txt", "README.md"),
+    }),
+})
+
+# category -> ((template_id, template), ...), built in one pass over TEMPLATES
+_by_category = {}
+for _tid, _t in TEMPLATES.items():
+    _by_category.setdefault(_t["category"], []).append((_tid, _t))
+TEMPLATES_BY_CATEGORY = MappingProxyType({cat: tuple(items) for cat, items in _by_category.items()})
+del _by_category, _tid, _t
+
+TEMPLATE_CATEGORIES = sorted(TEMPLATES_BY_CATEGORY)
+
+# Marker shown next to a template title; anything else is "Hard"
+DIFFICULTY_ICONS = MappingProxyType({"Easy": "🟢", "Medium": "🟡"})
+
+@lru_cache(maxsize=32)
+def template_files(template_id: str) -> MappingProxyType:
+    """Load file contents of a template (cached)"""
+    template_dir = TEMPLATES_DIR / template_id
+    return MappingProxyType({
+        fname: (template_dir / fname).read_text(encoding="utf-8")
+        for fname in TEMPLATES[template_id]["files"]
+    })
@@ -4,27 +4,80 @@ Database operations
 """
 
 import sqlite3
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Tuple
-from config import DB_PATH, OWNER_ID, ADMIN_ID
+from typing import Optional, List, Tuple, Dict
+from config import DB_PATH, OWNER_ID, ADMIN_ID, STATS_FLUSH_INTERVAL, USERS_FLUSH_INTERVAL, PAGINATION_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# (whole second, formatted string) of the last now_iso() call
+_now_iso_cache: Tuple[int, str] = (0, "")
 
 def now_iso() -> str:
-    """Get current timestamp in ISO format"""
-    return datetime.now().isoformat(timespec="seconds")
+    """Get current timestamp in ISO format (formatted at most once per second)"""
+    global _now_iso_cache
+    second = int(time.time())
+    if second != _now_iso_cache[0]:
+        _now_iso_cache = (second, datetime.fromtimestamp(second).isoformat(timespec="seconds"))
+    return _now_iso_cache[1]
+
+# One long-lived connection per thread, opened lazily by db_connect()
+_local = threading.local()
 
 def db_connect():
-    """Create database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
+    """Get the shared database connection for the current thread"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=512)
+        # Per-connection settings; journal_mode is persistent and set in init_database()
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        conn.execute("PRAGMA mmap_size=268435456;")
+        conn.execute("PRAGMA cache_size=-64000;")
+        _local.conn = conn
     return conn
 
+# Blocking sqlite calls from handlers run on these pools instead of the event
+# loop. Each worker thread gets its own connection from db_connect(); writes
+# go through a single thread so they never wait on each other.
+_read_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-read")
+_write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+async def db_read(func, *args):
+    """Run a read-only database helper off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_read_pool, partial(func, *args))
+
+async def db_write(func, *args):
+    """Run a database helper that writes on the single writer thread"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_write_pool, partial(func, *args))
+
+# bot_stats rows holding the row count of a table
+COUNTER_STATS = {
+    'count_users': 'users',
+    'count_projects': 'projects',
+    'count_files': 'files',
+    'count_banned': 'banned_users',
+    'count_admins': 'admins',
+}
+
 def init_database():
     """Initialize all database tables"""
     conn = db_connect()
     c = conn.cursor()
     
+    # WAL is stored in the database file, so it only needs setting once
+    c.execute("PRAGMA journal_mode=WAL;")
+    
     # Users table
     c.execute("""
     CREATE TABLE IF NOT EXISTS users(
@@ -139,101 +192,399 @@ def init_database():
     )
     """)
     
+    # Indexes for admin listings, activity/expiry range filters and user search
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_last_active ON users(last_active)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_subs_expiry ON subscriptions(expiry)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_projects_created ON projects(created_at)")
+    
+    # Full-text index over user names for admin search, kept in sync by triggers
+    c.execute("SELECT 1 FROM sqlite_master WHERE name='users_fts'")
+    fts_exists = c.fetchone() is not None
+    c.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username,
+        full_name,
+        content='users',
+        content_rowid='user_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, full_name)
+        VALUES(new.user_id, new.username, new.full_name);
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name)
+        VALUES('delete', old.user_id, old.username, old.full_name);
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, full_name ON users
+    WHEN old.username IS NOT new.username OR old.full_name IS NOT new.full_name
+    BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name)
+        VALUES('delete', old.user_id, old.username, old.full_name);
+        INSERT INTO users_fts(rowid, username, full_name)
+        VALUES(new.user_id, new.username, new.full_name);
+    END
+    """)
+    if not fts_exists:
+        c.execute("INSERT INTO users_fts(users_fts) VALUES('rebuild')")
+    
     # Add default admins
     c.execute("INSERT OR IGNORE INTO admins(user_id) VALUES(?)", (OWNER_ID,))
     c.execute("INSERT OR IGNORE INTO admins(user_id) VALUES(?)", (ADMIN_ID,))
     
+    # Row counters maintained by triggers so dashboards skip COUNT(*) scans
+    for stat, table in COUNTER_STATS.items():
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_count_ai AFTER INSERT ON {table} BEGIN
+            UPDATE bot_stats SET stat_value = stat_value + 1 WHERE stat_name='{stat}';
+        END
+        """)
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_count_ad AFTER DELETE ON {table} BEGIN
+            UPDATE bot_stats SET stat_value = stat_value - 1 WHERE stat_name='{stat}';
+        END
+        """)
+        # Resync on startup; covers databases created before the triggers
+        c.execute(f"""
+            INSERT OR REPLACE INTO bot_stats(stat_name, stat_value)
+            SELECT '{stat}', COUNT(*) FROM {table}
+        """)
+    
     conn.commit()
-    conn.close()
+
+# =============================================================================
+# HOT-PATH STATEMENTS
+# =============================================================================
+
+# Run on nearly every update; kept as constants so they always hit the
+# connection's prepared statement cache
+_SQL_UPSERT_USER = """
+    INSERT INTO users(user_id, username, full_name, join_date, last_active)
+    VALUES(?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        username=excluded.username,
+        full_name=excluded.full_name,
+        last_active=excluded.last_active
+"""
+_SQL_ADMIN_IDS = "SELECT user_id FROM admins"
+_SQL_BANNED_IDS = "SELECT user_id FROM banned_users"
+_SQL_PREMIUM_EXPIRY = "SELECT expiry FROM subscriptions WHERE user_id=?"
+
+# Behind most project and file screens
+_SQL_GET_PROJECT = """
+    SELECT project_id, name, entry_file, language, auto_restart, description, created_at
+    FROM projects WHERE user_id=? AND project_id=?
+"""
+_SQL_GET_PROJECT_WITH_FILE_STATS = """
+    SELECT p.project_id, p.name, p.entry_file, p.language, p.auto_restart,
+           p.description, p.created_at,
+           COUNT(f.file_name), COALESCE(SUM(f.file_size), 0)
+    FROM projects p
+    LEFT JOIN files f ON f.user_id = p.user_id AND f.project_id = p.project_id
+    WHERE p.user_id=? AND p.project_id=?
+    GROUP BY p.project_id
+"""
+_SQL_LIST_PROJECTS = """
+    SELECT project_id, name, entry_file, language, auto_restart, description
+    FROM projects WHERE user_id=?
+    ORDER BY project_id DESC
+"""
+_SQL_LIST_FILES = """
+    SELECT file_name, file_type, file_size, upload_date
+    FROM files WHERE user_id=? AND project_id=?
+    ORDER BY upload_date DESC, file_name
+"""
+_SQL_COUNT_PROJECTS = "SELECT COUNT(*) FROM projects WHERE user_id=?"
+_SQL_COUNT_FILES = "SELECT COUNT(*) FROM files WHERE user_id=? AND project_id=?"
+_SQL_LIST_PROJECTS_PAGE = _SQL_LIST_PROJECTS + "LIMIT ? OFFSET ?"
+_SQL_LIST_PROJECT_NAMES_PAGE = """
+    SELECT project_id, name
+    FROM projects WHERE user_id=?
+    ORDER BY project_id DESC
+    LIMIT ? OFFSET ?
+"""
+_SQL_LIST_CODE_FILES = """
+    SELECT file_name, file_type
+    FROM files WHERE user_id=? AND project_id=? AND file_type IN ('py', 'js')
+    ORDER BY upload_date DESC, file_name
+"""
+_SQL_LIST_FILES_PAGE = _SQL_LIST_FILES + "LIMIT ? OFFSET ?"
+
+def page_bounds(total: int, page: int, per_page: int) -> Tuple[int, int, int]:
+    """Clamp page to the available range; returns (page, pages, offset)"""
+    pages = max(1, (total + per_page - 1) // per_page)
+    page = min(max(1, page), pages)
+    return page, pages, (page - 1) * per_page
+
+# =============================================================================
+# READ CACHE
+# =============================================================================
+
+# The UI re-reads the same user's stats/projects/files on nearly every click,
+# so those helpers are cached per user for a short while. Anything that
+# writes them must call invalidate_user_cache().
+READ_CACHE_TTL = 15
+READ_CACHE_MAX_USERS = 2048
+
+# user_id -> {(helper, *args): (value, expiry_monotonic)}, least recent first
+_read_cache: "OrderedDict[int, Dict[tuple, Tuple[object, float]]]" = OrderedDict()
+# user_id -> bumped on every invalidation, so a read that raced a write is
+# not stored
+_read_cache_gen: Dict[int, int] = {}
+_read_cache_lock = threading.Lock()
+
+def cached_read(func):
+    """Cache a read helper whose first argument is user_id"""
+    name = func.__name__
+    
+    @wraps(func)
+    def wrapper(user_id: int, *args):
+        key = (name,) + args
+        with _read_cache_lock:
+            entries = _read_cache.get(user_id)
+            if entries is not None:
+                entry = entries.get(key)
+                if entry and entry[1] > time.monotonic():
+                    _read_cache.move_to_end(user_id)
+                    return entry[0]
+            gen = _read_cache_gen.get(user_id, 0)
+        
+        value = func(user_id, *args)
+        
+        with _read_cache_lock:
+            if _read_cache_gen.get(user_id, 0) == gen:
+                _read_cache.setdefault(user_id, {})[key] = (value, time.monotonic() + READ_CACHE_TTL)
+                _read_cache.move_to_end(user_id)
+                if len(_read_cache) > READ_CACHE_MAX_USERS:
+                    _read_cache.popitem(last=False)
+        return value
+    
+    return wrapper
+
+def invalidate_user_cache(user_id: int):
+    """Drop every cached read for a user"""
+    with _read_cache_lock:
+        _read_cache.pop(user_id, None)
+        _read_cache_gen[user_id] = _read_cache_gen.get(user_id, 0) + 1
 
 # =============================================================================
 # USER OPERATIONS
 # =============================================================================
 
+# Users known to have a row; their profile/last_active refreshes are
+# buffered and written by users_flush_loop()
+_known_users: set = set()
+# user_id -> latest upsert parameters not yet written
+_pending_users: Dict[int, tuple] = {}
+_pending_users_lock = threading.Lock()
+
 def ensure_user(user_id: int, username: str = None, full_name: str = None):
     """Ensure user exists in database"""
-    conn = db_connect()
-    c = conn.cursor()
+    now = now_iso()
+    row = (user_id, username, full_name, now, now)
     
-    c.execute("SELECT user_id FROM users WHERE user_id=?", (user_id,))
-    if not c.fetchone():
-        now = now_iso()
-        c.execute("""
-            INSERT INTO users(user_id, username, full_name, join_date, last_active)
-            VALUES(?, ?, ?, ?, ?)
-        """, (user_id, username, full_name, now, now))
-    else:
-        c.execute("""
-            UPDATE users SET last_active=?, username=?, full_name=?
-            WHERE user_id=?
-        """, (now_iso(), username, full_name, user_id))
+    # Existing user: only last_active/profile change, write it behind
+    if user_id in _known_users:
+        with _pending_users_lock:
+            _pending_users[user_id] = row
+        return
     
-    conn.commit()
-    conn.close()
+    # First contact: create the row right away so reads see it
+    conn = db_connect()
+    with conn:
+        conn.execute(_SQL_UPSERT_USER, row)
+    _known_users.add(user_id)
+
+def flush_users():
+    """Write buffered ensure_user updates in one transaction"""
+    global _pending_users
+    with _pending_users_lock:
+        if not _pending_users:
+            return
+        pending, _pending_users = _pending_users, {}
+    
+    conn = db_connect()
+    try:
+        with conn:
+            conn.executemany(_SQL_UPSERT_USER, pending.values())
+    except sqlite3.Error:
+        # Keep them for the next flush unless newer values arrived meanwhile
+        with _pending_users_lock:
+            for user_id, row in pending.items():
+                _pending_users.setdefault(user_id, row)
+        raise
+
+async def users_flush_loop():
+    """Flush buffered ensure_user updates every USERS_FLUSH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(USERS_FLUSH_INTERVAL)
+        try:
+            await db_write(flush_users)
+        except sqlite3.Error as e:
+            logger.warning("Users flush failed: %s", e)
+
+# =============================================================================
+# ROLE CACHE
+# =============================================================================
+
+# Role checks run on nearly every update, so results are kept for a short
+# while. Anything that changes a role must call clear_role_cache().
+ROLE_CACHE_TTL = 60
+ROLE_CACHE_MAX_USERS = 4096
+
+# user_id -> (flag, expiry_monotonic), oldest write first; every write gets
+# the same TTL, so the front also holds the entries that expire first
+_premium_cache: "OrderedDict[int, Tuple[bool, float]]" = OrderedDict()
+_role_cache_lock = threading.Lock()
+
+# The admin and ban lists are small and checked on every update, so the
+# whole sets are held in memory and reloaded lazily after any role change
+_admin_ids: Optional[frozenset] = None
+_banned_ids: Optional[frozenset] = None
+_role_gen = 0
+
+def _cache_get(cache: dict, user_id: int) -> Optional[bool]:
+    """Get cached flag if it has not expired"""
+    entry = cache.get(user_id)
+    if entry and entry[1] > time.monotonic():
+        return entry[0]
+    return None
+
+def _cache_set(cache: OrderedDict, user_id: int, value: bool) -> bool:
+    """Store flag in cache, dropping expired and overflow entries, and return it"""
+    now = time.monotonic()
+    with _role_cache_lock:
+        cache[user_id] = (value, now + ROLE_CACHE_TTL)
+        cache.move_to_end(user_id)
+        while cache:
+            oldest = next(iter(cache.values()))
+            if len(cache) <= ROLE_CACHE_MAX_USERS and oldest[1] > now:
+                break
+            cache.popitem(last=False)
+    return value
+
+def clear_role_cache(user_id: int):
+    """Drop cached admin/banned/premium flags for a user"""
+    global _admin_ids, _banned_ids, _role_gen
+    with _role_cache_lock:
+        _premium_cache.pop(user_id, None)
+    _admin_ids = None
+    _banned_ids = None
+    _role_gen += 1
+    invalidate_user_cache(user_id)
+
+def _load_id_set(sql: str) -> Tuple[frozenset, bool]:
+    """Read a set of user IDs; the flag says whether it is still current"""
+    gen = _role_gen
+    conn = db_connect()
+    ids = frozenset(uid for (uid,) in conn.execute(sql))
+    # Don't keep a set that a concurrent role change already outdated
+    return ids, gen == _role_gen
+
+def admin_ids() -> frozenset:
+    """IDs in the admins table (the owner is not necessarily included)"""
+    global _admin_ids
+    admins = _admin_ids
+    if admins is None:
+        admins, current = _load_id_set(_SQL_ADMIN_IDS)
+        if current:
+            _admin_ids = admins
+    return admins
 
 def is_admin(user_id: int) -> bool:
     """Check if user is admin"""
-    conn = db_connect()
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM admins WHERE user_id=?", (user_id,))
-    result = c.fetchone() is not None
-    conn.close()
-    return result or user_id == OWNER_ID
+    return user_id == OWNER_ID or user_id in admin_ids()
 
 def is_banned(user_id: int) -> bool:
     """Check if user is banned"""
-    conn = db_connect()
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM banned_users WHERE user_id=?", (user_id,))
-    result = c.fetchone() is not None
-    conn.close()
-    return result
+    global _banned_ids
+    banned = _banned_ids
+    if banned is None:
+        banned, current = _load_id_set(_SQL_BANNED_IDS)
+        if current:
+            _banned_ids = banned
+    return user_id in banned
 
 def is_premium(user_id: int) -> bool:
     """Check if user has active premium"""
+    cached = _cache_get(_premium_cache, user_id)
+    if cached is not None:
+        return cached
+    
     conn = db_connect()
-    c = conn.cursor()
-    c.execute("SELECT expiry FROM subscriptions WHERE user_id=?", (user_id,))
-    row = c.fetchone()
-    conn.close()
+    row = conn.execute(_SQL_PREMIUM_EXPIRY, (user_id,)).fetchone()
+    return _cache_set(_premium_cache, user_id, _expiry_active(row[0] if row else None))
+
+def get_role_flags_bulk(user_ids: List[int]) -> Dict[int, Tuple[bool, bool, bool]]:
+    """Get (is_admin, is_premium, is_banned) for many users in one query"""
+    premium = {}
+    missing = []
+    for uid in dict.fromkeys(user_ids):
+        cached = _cache_get(_premium_cache, uid)
+        if cached is None:
+            missing.append(uid)
+        else:
+            premium[uid] = cached
     
-    if not row:
-        return False
+    if missing:
+        conn = db_connect()
+        expiries = dict(conn.execute(
+            f"SELECT user_id, expiry FROM subscriptions WHERE user_id IN ({','.join('?' * len(missing))})",
+            missing
+        ))
+        for uid in missing:
+            premium[uid] = _cache_set(_premium_cache, uid, _expiry_active(expiries.get(uid)))
     
+    # Admin and banned flags come from the in-memory sets
+    return {uid: (is_admin(uid), flag, is_banned(uid)) for uid, flag in premium.items()}
+
+def _expiry_active(expiry: Optional[str]) -> bool:
+    """Check if a subscription expiry timestamp is in the future"""
+    if not expiry:
+        return False
     try:
-        expiry = datetime.fromisoformat(row[0])
-        return expiry > datetime.now()
-    except:
+        return datetime.fromisoformat(expiry) > datetime.now()
+    except ValueError:
         return False
 
+@cached_read
 def get_user_stats(user_id: int) -> dict:
     """Get user statistics"""
     conn = db_connect()
     c = conn.cursor()
     
-    # Get user info
-    c.execute("SELECT join_date, last_active, active_project_id FROM users WHERE user_id=?", (user_id,))
-    user_row = c.fetchone()
-    
-    # Count projects
-    c.execute("SELECT COUNT(*) FROM projects WHERE user_id=?", (user_id,))
-    project_count = c.fetchone()[0]
-    
-    # Count files
-    c.execute("SELECT COUNT(*) FROM files WHERE user_id=?", (user_id,))
-    file_count = c.fetchone()[0]
-    
-    conn.close()
+    # User info, counters and role flags in one statement; the LEFT JOIN
+    # keeps a row even for IDs that never started the bot
+    c.execute("""
+        SELECT u.join_date, u.last_active, u.active_project_id,
+            (SELECT COUNT(*) FROM projects WHERE user_id=:uid),
+            (SELECT COUNT(*) FROM files WHERE user_id=:uid),
+            EXISTS(SELECT 1 FROM admins WHERE user_id=:uid),
+            EXISTS(SELECT 1 FROM banned_users WHERE user_id=:uid),
+            (SELECT expiry FROM subscriptions WHERE user_id=:uid)
+        FROM (SELECT :uid AS user_id) q
+        LEFT JOIN users u ON u.user_id = q.user_id
+    """, {'uid': user_id})
+    (join_date, last_active, active_project_id, project_count, file_count,
+     admin_flag, banned_flag, expiry) = c.fetchone()
     
+    # Refresh the role cache with what we just read
     return {
-        'join_date': user_row[0] if user_row else None,
-        'last_active': user_row[1] if user_row else None,
-        'active_project_id': user_row[2] if user_row else None,
+        'join_date': join_date,
+        'last_active': last_active,
+        'active_project_id': active_project_id,
         'project_count': project_count,
         'file_count': file_count,
-        'is_premium': is_premium(user_id),
-        'is_admin': is_admin(user_id),
-        'is_banned': is_banned(user_id)
+        'is_premium': _cache_set(_premium_cache, user_id, _expiry_active(expiry)),
+        'is_admin': user_id == OWNER_ID or bool(admin_flag),
+        'is_banned': bool(banned_flag)
     }
 
 # =============================================================================
@@ -243,157 +594,286 @@ def get_user_stats(user_id: int) -> dict:
 def create_project(user_id: int, name: str, description: str = "") -> int:
     """Create new project"""
     conn = db_connect()
-    c = conn.cursor()
     now = now_iso()
     
-    c.execute("""
-        INSERT INTO projects(user_id, name, entry_file, language, auto_restart, created_at, updated_at, description)
-        VALUES(?, ?, '', '', 0, ?, ?, ?)
-    """, (user_id, name.strip(), now, now, description))
-    
-    project_id = c.lastrowid
-    
-    # Set as active if user has no active project
-    c.execute("SELECT active_project_id FROM users WHERE user_id=?", (user_id,))
-    row = c.fetchone()
-    if row and row[0] is None:
-        c.execute("UPDATE users SET active_project_id=? WHERE user_id=?", (project_id, user_id))
+    with conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO projects(user_id, name, entry_file, language, auto_restart, created_at, updated_at, description)
+            VALUES(?, ?, '', '', 0, ?, ?, ?)
+        """, (user_id, name.strip(), now, now, description))
+        
+        project_id = c.lastrowid
+        
+        # Set as active if user has no active project
+        c.execute("SELECT active_project_id FROM users WHERE user_id=?", (user_id,))
+        row = c.fetchone()
+        if row and row[0] is None:
+            c.execute("UPDATE users SET active_project_id=? WHERE user_id=?", (project_id, user_id))
     
-    conn.commit()
-    conn.close()
+    invalidate_user_cache(user_id)
     return project_id
 
+@cached_read
 def get_project(user_id: int, project_id: int) -> Optional[Tuple]:
     """Get project details"""
     conn = db_connect()
-    c = conn.cursor()
-    c.execute("""
-        SELECT project_id, name, entry_file, language, auto_restart, description, created_at
-        FROM projects WHERE user_id=? AND project_id=?
-    """, (user_id, project_id))
-    row = c.fetchone()
-    conn.close()
-    return row
+    return conn.execute(_SQL_GET_PROJECT, (user_id, project_id)).fetchone()
 
+@cached_read
+def get_project_with_file_stats(user_id: int, project_id: int) -> Optional[Tuple]:
+    """Get project details plus its file count and total file size"""
+    conn = db_connect()
+    return conn.execute(_SQL_GET_PROJECT_WITH_FILE_STATS, (user_id, project_id)).fetchone()
+
+@cached_read
 def list_projects(user_id: int) -> List[Tuple]:
     """List all user projects"""
     conn = db_connect()
-    c = conn.cursor()
-    c.execute("""
-        SELECT project_id, name, entry_file, language, auto_restart, description
-        FROM projects WHERE user_id=?
-        ORDER BY project_id DESC
-    """, (user_id,))
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    return conn.execute(_SQL_LIST_PROJECTS, (user_id,)).fetchall()
+
+@cached_read
+def list_projects_page(user_id: int, page: int, per_page: int = PAGINATION_PAGE_SIZE) -> Tuple[List[Tuple], int, int, int]:
+    """One page of user projects; returns (rows, page, pages, total)"""
+    conn = db_connect()
+    total = conn.execute(_SQL_COUNT_PROJECTS, (user_id,)).fetchone()[0]
+    page, pages, offset = page_bounds(total, page, per_page)
+    rows = conn.execute(_SQL_LIST_PROJECTS_PAGE, (user_id, per_page, offset)).fetchall()
+    return rows, page, pages, total
+
+@cached_read
+def list_project_names_page(user_id: int, page: int, per_page: int = PAGINATION_PAGE_SIZE) -> Tuple[List[Tuple], int, int, int]:
+    """One page of (project_id, name) rows; returns (rows, page, pages, total)"""
+    conn = db_connect()
+    total = conn.execute(_SQL_COUNT_PROJECTS, (user_id,)).fetchone()[0]
+    page, pages, offset = page_bounds(total, page, per_page)
+    rows = conn.execute(_SQL_LIST_PROJECT_NAMES_PAGE, (user_id, per_page, offset)).fetchall()
+    return rows, page, pages, total
 
 def update_project_settings(user_id: int, project_id: int, entry_file: str, language: str, auto_restart: int):
     """Update project settings"""
     conn = db_connect()
-    c = conn.cursor()
-    c.execute("""
-        UPDATE projects SET entry_file=?, language=?, auto_restart=?, updated_at=?
-        WHERE user_id=? AND project_id=?
-    """, (entry_file, language, auto_restart, now_iso(), user_id, project_id))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            UPDATE projects SET entry_file=?, language=?, auto_restart=?, updated_at=?
+            WHERE user_id=? AND project_id=?
+        """, (entry_file, language, auto_restart, now_iso(), user_id, project_id))
+    invalidate_user_cache(user_id)
 
 def delete_project(user_id: int, project_id: int):
     """Delete project and all related data"""
     conn = db_connect()
-    c = conn.cursor()
-    
-    c.execute("DELETE FROM favorites WHERE user_id=? AND project_id=?", (user_id, project_id))
-    c.execute("DELETE FROM files WHERE user_id=? AND project_id=?", (user_id, project_id))
-    c.execute("DELETE FROM env_vars WHERE user_id=? AND project_id=?", (user_id, project_id))
-    c.execute("DELETE FROM installed_packages WHERE user_id=? AND project_id=?", (user_id, project_id))
-    c.execute("DELETE FROM projects WHERE user_id=? AND project_id=?", (user_id, project_id))
     
-    # Clear active project if it was this one
-    c.execute("SELECT active_project_id FROM users WHERE user_id=?", (user_id,))
-    row = c.fetchone()
-    if row and row[0] == project_id:
-        c.execute("UPDATE users SET active_project_id=NULL WHERE user_id=?", (user_id,))
+    # Single transaction: commits once, rolls back if any statement fails
+    with conn:
+        c = conn.cursor()
+        
+        c.execute("DELETE FROM favorites WHERE user_id=? AND project_id=?", (user_id, project_id))
+        c.execute("DELETE FROM files WHERE user_id=? AND project_id=?", (user_id, project_id))
+        c.execute("DELETE FROM env_vars WHERE user_id=? AND project_id=?", (user_id, project_id))
+        c.execute("DELETE FROM installed_packages WHERE user_id=? AND project_id=?", (user_id, project_id))
+        c.execute("DELETE FROM projects WHERE user_id=? AND project_id=?", (user_id, project_id))
+        
+        # Clear active project if it was this one
+        c.execute(
+            "UPDATE users SET active_project_id=NULL WHERE user_id=? AND active_project_id=?",
+            (user_id, project_id)
+        )
     
-    conn.commit()
-    conn.close()
+    invalidate_user_cache(user_id)
 
 # =============================================================================
 # FILE OPERATIONS
 # =============================================================================
 
+# Inserts a file row or refreshes an existing one
+_SQL_ADD_FILE = """
+    INSERT INTO files(user_id, project_id, file_name, file_type, file_size, upload_date)
+    VALUES(?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, project_id, file_name) DO UPDATE SET
+        file_type=excluded.file_type,
+        file_size=excluded.file_size,
+        upload_date=excluded.upload_date
+"""
+
 def add_file(user_id: int, project_id: int, file_name: str, file_type: str, file_size: int):
     """Add file to database"""
     conn = db_connect()
-    c = conn.cursor()
-    c.execute("""
-        INSERT OR REPLACE INTO files(user_id, project_id, file_name, file_type, file_size, upload_date)
-        VALUES(?, ?, ?, ?, ?, ?)
-    """, (user_id, project_id, file_name, file_type, file_size, now_iso()))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute(_SQL_ADD_FILE, (user_id, project_id, file_name, file_type, file_size, now_iso()))
+    invalidate_user_cache(user_id)
+
+def add_files(user_id: int, project_id: int, files: List[Tuple[str, str, int]]):
+    """Add several (file_name, file_type, file_size) rows in one transaction"""
+    uploaded = now_iso()
+    conn = db_connect()
+    with conn:
+        conn.executemany(_SQL_ADD_FILE, [
+            (user_id, project_id, file_name, file_type, file_size, uploaded)
+            for file_name, file_type, file_size in files
+        ])
+    invalidate_user_cache(user_id)
 
 def remove_file(user_id: int, project_id: int, file_name: str):
     """Remove file from database"""
     conn = db_connect()
-    c = conn.cursor()
-    c.execute("DELETE FROM files WHERE user_id=? AND project_id=? AND file_name=?", 
-              (user_id, project_id, file_name))
-    c.execute("DELETE FROM favorites WHERE user_id=? AND project_id=? AND file_name=?",
-              (user_id, project_id, file_name))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("DELETE FROM files WHERE user_id=? AND project_id=? AND file_name=?",
+                     (user_id, project_id, file_name))
+        conn.execute("DELETE FROM favorites WHERE user_id=? AND project_id=? AND file_name=?",
+                     (user_id, project_id, file_name))
+    invalidate_user_cache(user_id)
 
+@cached_read
 def list_files(user_id: int, project_id: int) -> List[Tuple]:
     """List all files in project"""
     conn = db_connect()
-    c = conn.cursor()
-    c.execute("""
-        SELECT file_name, file_type, file_size, upload_date
+    return conn.execute(_SQL_LIST_FILES, (user_id, project_id)).fetchall()
+
+@cached_read
+def list_code_files(user_id: int, project_id: int) -> List[Tuple]:
+    """List (file_name, file_type) of the project's Python and JavaScript files"""
+    conn = db_connect()
+    return conn.execute(_SQL_LIST_CODE_FILES, (user_id, project_id)).fetchall()
+
+@cached_read
+def list_files_page(user_id: int, project_id: int, page: int, per_page: int = PAGINATION_PAGE_SIZE) -> Tuple[List[Tuple], int, int, int]:
+    """One page of project files; returns (rows, page, pages, total)"""
+    conn = db_connect()
+    total = conn.execute(_SQL_COUNT_FILES, (user_id, project_id)).fetchone()[0]
+    page, pages, offset = page_bounds(total, page, per_page)
+    rows = conn.execute(_SQL_LIST_FILES_PAGE, (user_id, project_id, per_page, offset)).fetchall()
+    return rows, page, pages, total
+
+@cached_read
+def get_file_aggregates(user_id: int, project_id: int) -> Tuple[int, int, int, int]:
+    """Get (file count, total size, python files, javascript files) for a project"""
+    conn = db_connect()
+    return conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(file_size), 0),
+               COALESCE(SUM(file_type = 'py'), 0), COALESCE(SUM(file_type = 'js'), 0)
         FROM files WHERE user_id=? AND project_id=?
-        ORDER BY upload_date DESC
-    """, (user_id, project_id))
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    """, (user_id, project_id)).fetchone()
 
+@cached_read
 def count_user_files(user_id: int) -> int:
     """Count total files for user"""
     conn = db_connect()
     c = conn.cursor()
     c.execute("SELECT COUNT(*) FROM files WHERE user_id=?", (user_id,))
     count = c.fetchone()[0]
-    conn.close()
     return count
 
+# =============================================================================
+# FAVORITES
+# =============================================================================
+
+def toggle_favorite(user_id: int, project_id: int, file_name: str) -> bool:
+    """Add or remove a favorite file; returns True if it is now a favorite"""
+    conn = db_connect()
+    with conn:
+        # The insert is a no-op on the primary key exactly when the row exists
+        added = conn.execute(
+            "INSERT INTO favorites(user_id, project_id, file_name) VALUES(?, ?, ?) ON CONFLICT DO NOTHING",
+            (user_id, project_id, file_name)
+        ).rowcount == 1
+        if not added:
+            conn.execute(
+                "DELETE FROM favorites WHERE user_id=? AND project_id=? AND file_name=?",
+                (user_id, project_id, file_name)
+            )
+    
+    invalidate_user_cache(user_id)
+    return added
+
+@cached_read
+def list_favorites(user_id: int, limit: int = 30) -> List[Tuple]:
+    """List favorite files as (project_id, file_name, project_name)"""
+    conn = db_connect()
+    return conn.execute("""
+        SELECT f.project_id, f.file_name, p.name
+        FROM favorites f
+        JOIN projects p ON f.project_id = p.project_id AND f.user_id = p.user_id
+        WHERE f.user_id = ?
+        ORDER BY f.project_id DESC
+        LIMIT ?
+    """, (user_id, limit)).fetchall()
+
 # =============================================================================
 # STATISTICS
 # =============================================================================
 
+# Adds to a counter, creating its row if missing
+_SQL_STAT_ADD = """
+    INSERT INTO bot_stats(stat_name, stat_value) VALUES(?, ?)
+    ON CONFLICT(stat_name) DO UPDATE SET stat_value = stat_value + excluded.stat_value
+"""
+
+# Increments not yet written to bot_stats, flushed by stats_flush_loop()
+_pending_stats: Counter = Counter()
+_pending_lock = threading.Lock()
+
+# Seconds a bot_stats snapshot is reused by get_all_stats()
+STATS_CACHE_TTL = 2
+
+# (bot_stats snapshot, expiry_monotonic); dropped after every flush
+_stats_cache: Optional[Tuple[dict, float]] = None
+
 def stat_increment(stat_name: str, amount: int = 1):
-    """Increment a statistic"""
+    """Increment a statistic (buffered in memory until the next flush)"""
+    with _pending_lock:
+        _pending_stats[stat_name] += amount
+
+def flush_stats():
+    """Write buffered statistic increments in one transaction"""
+    global _pending_stats, _stats_cache
+    with _pending_lock:
+        if not _pending_stats:
+            return
+        pending, _pending_stats = _pending_stats, Counter()
+    
     conn = db_connect()
-    c = conn.cursor()
-    c.execute("UPDATE bot_stats SET stat_value = stat_value + ? WHERE stat_name=?", 
-              (amount, stat_name))
-    conn.commit()
-    conn.close()
+    try:
+        with conn:
+            conn.executemany(_SQL_STAT_ADD, pending.items())
+    except sqlite3.Error:
+        # Put the deltas back so the next flush retries them
+        with _pending_lock:
+            _pending_stats.update(pending)
+        raise
+    finally:
+        _stats_cache = None
+
+async def stats_flush_loop():
+    """Flush buffered statistics every STATS_FLUSH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(STATS_FLUSH_INTERVAL)
+        try:
+            await db_write(flush_stats)
+        except sqlite3.Error as e:
+            logger.warning("Stats flush failed: %s", e)
 
 def stat_get(stat_name: str) -> int:
     """Get statistic value"""
     conn = db_connect()
-    c = conn.cursor()
-    c.execute("SELECT stat_value FROM bot_stats WHERE stat_name=?", (stat_name,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else 0
+    row = conn.execute("SELECT stat_value FROM bot_stats WHERE stat_name=?", (stat_name,)).fetchone()
+    with _pending_lock:
+        pending = _pending_stats[stat_name]
+    return (row[0] if row else 0) + pending
 
 def get_all_stats() -> dict:
     """Get all statistics"""
-    conn = db_connect()
-    c = conn.cursor()
-    c.execute("SELECT stat_name, stat_value FROM bot_stats")
-    rows = c.fetchall()
-    conn.close()
-    return {row[0]: row[1] for row in rows}
\ No newline at end of file
+    global _stats_cache
+    cached = _stats_cache
+    if cached and cached[1] > time.monotonic():
+        stats = dict(cached[0])
+    else:
+        conn = db_connect()
+        snapshot = dict(conn.execute("SELECT stat_name, stat_value FROM bot_stats"))
+        _stats_cache = (snapshot, time.monotonic() + STATS_CACHE_TTL)
+        stats = dict(snapshot)
+    
+    with _pending_lock:
+        for name, amount in _pending_stats.items():
+            stats[name] = stats.get(name, 0) + amount
+    return stats
\ No newline at end of file
@@ -6,16 +6,24 @@ Process hosting and management
 import os
 import sys
 import time
+import mmap
+import threading
+import signal
+import shutil
+import re
+import importlib.metadata
+from collections import Counter
 import asyncio
 import subprocess
 import psutil
 from pathlib import Path
 from datetime import datetime
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Dict, Tuple
 from config import (
     USERS_DIR, AUTO_RESTART_CHECK_INTERVAL, 
-    AUTO_RESTART_BACKOFF_SEC, LOGS_DIR
+    AUTO_RESTART_BACKOFF_SEC, LOGS_DIR, MAX_CONCURRENT_INSTALLS
 )
 from database import get_project, stat_increment
 
@@ -33,23 +41,82 @@ class RunningProcess:
     restart_count: int = 0
     last_exit_code: Optional[int] = None
     backoff_until: float = 0.0
+    pidfd: Optional[int] = None
+    alive: bool = True  # Cleared by the exit watcher / monitor sweep
+    ps: Optional[psutil.Process] = None  # Primed for interval-free cpu_percent()
+    prev_jiffies: int = 0  # CPU time at the last read_proc_stats() sample
+    prev_sample_time: float = 0.0
+    stats_snapshot: Optional[Dict] = None  # Last get_process_stats() result
+    stats_expires: float = 0.0
 
 # Global dict of running processes
 running_processes: Dict[str, RunningProcess] = {}
+# user_id -> number of entries in running_processes; only changed through
+# _track_process / _untrack_process
+per_user_running: Counter = Counter()
+# stop_process may run in a worker thread
+_running_lock = threading.Lock()
+
+def _track_process(key: str, proc_info: RunningProcess):
+    """Add or replace a running_processes entry"""
+    with _running_lock:
+        if key not in running_processes:
+            per_user_running[proc_info.user_id] += 1
+        running_processes[key] = proc_info
+
+def _untrack_process(key: str):
+    """Remove a running_processes entry"""
+    with _running_lock:
+        proc_info = running_processes.pop(key, None)
+        if proc_info is not None:
+            per_user_running[proc_info.user_id] -= 1
+            if per_user_running[proc_info.user_id] <= 0:
+                del per_user_running[proc_info.user_id]
+
+def count_user_running(user_id: int) -> int:
+    """Number of tracked processes for a user"""
+    return per_user_running.get(user_id, 0)
+
+# uv (https://github.com/astral-sh/uv) builds venvs and installs packages much
+# faster than venv + pip; used when it is on PATH
+UV_PATH = shutil.which("uv")
+
+# Loop running auto_restart_monitor; pidfd exit watchers are registered on it
+_monitor_loop: Optional[asyncio.AbstractEventLoop] = None
+# Set when a watched process exits so the monitor wakes up immediately
+_exit_event: Optional[asyncio.Event] = None
 
 def make_key(user_id: int, project_id: int) -> str:
     """Create unique key for process"""
     return f"{user_id}:{project_id}"
 
-def get_project_root(user_id: int, project_id: int) -> Path:
-    """Get project directory path"""
-    path = USERS_DIR / str(user_id) / f"project_{project_id}"
-    path.mkdir(parents=True, exist_ok=True)
+# Directories this process has already created, so mkdir runs once per path
+_created_dirs: set = set()
+
+def _ensure_dir(path: Path) -> Path:
+    """Create directory on first use"""
+    if path not in _created_dirs:
+        path.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(path)
     return path
 
+@lru_cache(maxsize=1024)
+def project_root_path(user_id: int, project_id: int) -> Path:
+    """Get project directory path without touching the filesystem"""
+    return USERS_DIR / str(user_id) / f"project_{project_id}"
+
+def get_project_root(user_id: int, project_id: int) -> Path:
+    """Get project directory path, creating it if needed"""
+    return _ensure_dir(project_root_path(user_id, project_id))
+
+def forget_project_root(user_id: int, project_id: int):
+    """Forget that a project directory exists (call after deleting it)"""
+    _created_dirs.discard(project_root_path(user_id, project_id))
+
+@lru_cache(maxsize=1024)
 def get_venv_path(user_id: int, project_id: int) -> Path:
     """Get virtual environment path"""
-    return get_project_root(user_id, project_id) / ".venv"
+    return project_root_path(user_id, project_id) / ".venv"
 
 def get_python_executable(user_id: int, project_id: int) -> Path:
     """Get Python executable (venv or system)"""
@@ -71,11 +138,50 @@ def get_pip_executable(user_id: int, project_id: int) -> Path:
 
 def get_log_path(user_id: int, project_id: int) -> Path:
     """Get log file path"""
-    log_dir = LOGS_DIR / str(user_id)
-    log_dir.mkdir(parents=True, exist_ok=True)
-    return log_dir / f"project_{project_id}.log"
+    return _ensure_dir(LOGS_DIR / str(user_id)) / f"project_{project_id}.log"
+
+def _pip_cmd(user_id: int, project_id: int, subcommand: str) -> list:
+    """Build a pip command for the project's venv (uv pip if available)"""
+    if UV_PATH:
+        python_path = get_python_executable(user_id, project_id)
+        return [UV_PATH, "pip", subcommand, "--python", str(python_path)]
+    return [str(get_pip_executable(user_id, project_id)), subcommand]
 
-def create_venv(user_id: int, project_id: int) -> Tuple[bool, str]:
+def _installed_version(user_id: int, project_id: int, package_name: str) -> str:
+    """Read an installed package's version from the venv's dist-info metadata"""
+    venv = get_venv_path(user_id, project_id)
+    if os.name == 'nt':
+        site_packages = venv / "Lib" / "site-packages"
+    else:
+        site_packages = venv / "lib" / f"python{sys.version_info[0]}.{sys.version_info[1]}" / "site-packages"
+    
+    # Strip extras / version specifiers ("pkg[extra]>=1.0" -> "pkg")
+    name = re.split(r"[\s\[<>=!~;@]", package_name.strip(), 1)[0]
+    for dist in importlib.metadata.distributions(name=name, path=[str(site_packages)]):
+        return dist.version
+    return "unknown"
+
+async def _run_command(cmd: list, timeout: int) -> subprocess.CompletedProcess:
+    """Run a command without blocking the event loop (subprocess.run equivalent)"""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    
+    return subprocess.CompletedProcess(
+        cmd, proc.returncode,
+        stdout.decode(errors='replace'),
+        stderr.decode(errors='replace')
+    )
+
+async def create_venv(user_id: int, project_id: int) -> Tuple[bool, str]:
     """Create virtual environment"""
     venv_path = get_venv_path(user_id, project_id)
     
@@ -83,12 +189,12 @@ def create_venv(user_id: int, project_id: int) -> Tuple[bool, str]:
         return True, "Virtual environment already exists"
     
     try:
-        result = subprocess.run(
-            [sys.executable, "-m", "venv", str(venv_path)],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
+        if UV_PATH:
+            cmd = [UV_PATH, "venv", "--python", sys.executable, str(venv_path)]
+        else:
+            cmd = [sys.executable, "-m", "venv", str(venv_path)]
+        
+        result = await _run_command(cmd, timeout=60)
         
         if result.returncode == 0:
             return True, "✅ Virtual environment created"
@@ -98,7 +204,61 @@ def create_venv(user_id: int, project_id: int) -> Tuple[bool, str]:
     except Exception as e:
         return False, f"❌ Error creating venv: {e}"
 
-def install_requirements(user_id: int, project_id: int) -> Tuple[bool, str]:
+# Installs in flight keyed by (user_id, project_id, target), so identical
+# concurrent requests share one pip run
+_install_inflight: Dict[tuple, asyncio.Future] = {}
+# One pip run at a time per venv
+_venv_locks: Dict[Tuple[int, int], asyncio.Lock] = {}
+# Caps pip runs across all projects; each one can take 100+ MB and hammer the disk
+_install_slots = asyncio.Semaphore(MAX_CONCURRENT_INSTALLS)
+# Installs holding a slot / waiting for one
+_installs_running = 0
+_installs_waiting = 0
+
+def install_queue_position() -> int:
+    """How many installs a new request would wait behind (0 if a slot is free)"""
+    if _installs_running < MAX_CONCURRENT_INSTALLS:
+        return 0
+    return _installs_waiting + 1
+
+async def _shared_install(job_key: tuple, func, *args) -> Tuple[bool, str]:
+    """Run an install once per job key; concurrent callers await the same result"""
+    task = _install_inflight.get(job_key)
+    if task is None:
+        task = asyncio.ensure_future(_locked_install(job_key[:2], func, *args))
+        _install_inflight[job_key] = task
+        task.add_done_callback(lambda _: _install_inflight.pop(job_key, None))
+    # Shielded so one caller being cancelled does not cancel the others
+    return await asyncio.shield(task)
+
+async def _locked_install(venv_key: Tuple[int, int], func, *args) -> Tuple[bool, str]:
+    """Run an install while holding the venv's lock"""
+    global _installs_running, _installs_waiting
+    lock = _venv_locks.setdefault(venv_key, asyncio.Lock())
+    async with lock:
+        _installs_waiting += 1
+        try:
+            await _install_slots.acquire()
+        finally:
+            _installs_waiting -= 1
+        
+        _installs_running += 1
+        try:
+            return await func(*args)
+        finally:
+            _installs_running -= 1
+            _install_slots.release()
+
+async def install_requirements(user_id: int, project_id: int) -> Tuple[bool, str]:
+    """Install requirements.txt"""
+    return await _shared_install((user_id, project_id, "-r"), _install_requirements, user_id, project_id)
+
+async def install_package(user_id: int, project_id: int, package_name: str) -> Tuple[bool, str]:
+    """Install single package"""
+    job_key = (user_id, project_id, package_name.strip().lower())
+    return await _shared_install(job_key, _install_package, user_id, project_id, package_name)
+
+async def _install_requirements(user_id: int, project_id: int) -> Tuple[bool, str]:
     """Install requirements.txt"""
     project_root = get_project_root(user_id, project_id)
     req_file = project_root / "requirements.txt"
@@ -107,17 +267,13 @@ def install_requirements(user_id: int, project_id: int) -> Tuple[bool, str]:
         return False, "❌ requirements.txt not found"
     
     # Ensure venv exists
-    venv_ok, venv_msg = create_venv(user_id, project_id)
+    venv_ok, venv_msg = await create_venv(user_id, project_id)
     if not venv_ok:
         return False, venv_msg
     
-    pip_path = get_pip_executable(user_id, project_id)
-    
     try:
-        result = subprocess.run(
-            [str(pip_path), "install", "-r", str(req_file)],
-            capture_output=True,
-            text=True,
+        result = await _run_command(
+            _pip_cmd(user_id, project_id, "install") + ["-r", str(req_file)],
             timeout=300
         )
         
@@ -131,39 +287,21 @@ def install_requirements(user_id: int, project_id: int) -> Tuple[bool, str]:
     except Exception as e:
         return False, f"❌ Installation error: {e}"
 
-def install_package(user_id: int, project_id: int, package_name: str) -> Tuple[bool, str]:
+async def _install_package(user_id: int, project_id: int, package_name: str) -> Tuple[bool, str]:
     """Install single package"""
     # Ensure venv exists
-    venv_ok, venv_msg = create_venv(user_id, project_id)
+    venv_ok, venv_msg = await create_venv(user_id, project_id)
     if not venv_ok:
         return False, venv_msg
     
-    pip_path = get_pip_executable(user_id, project_id)
-    
     try:
-        result = subprocess.run(
-            [str(pip_path), "install", package_name],
-            capture_output=True,
-            text=True,
+        result = await _run_command(
+            _pip_cmd(user_id, project_id, "install") + [package_name],
             timeout=180
         )
         
         if result.returncode == 0:
-            # Get installed version
-            version_result = subprocess.run(
-                [str(pip_path), "show", package_name],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            version = "unknown"
-            if version_result.returncode == 0:
-                for line in version_result.stdout.split('\n'):
-                    if line.startswith('Version:'):
-                        version = line.split(':', 1)[1].strip()
-                        break
-            
+            version = _installed_version(user_id, project_id, package_name)
             return True, f"✅ Installed {package_name} v{version}"
         else:
             return False, f"❌ Failed to install:\n{result.stderr[-500:]}"
@@ -199,36 +337,41 @@ def start_process(user_id: int, project_id: int) -> Tuple[bool, str]:
     if not entry_path.exists():
         return False, f"❌ Entry file not found: {entry}"
     
-    # Open log file
+    # Prepare command
+    if lang == 'py':
+        python_path = get_python_executable(user_id, project_id)
+        cmd = [str(python_path), str(entry_path)]
+    elif lang == 'js':
+        cmd = ['node', str(entry_path)]
+    else:
+        return False, f"❌ Unsupported language: {lang}"
+    
+    # Open log file as a raw append-only fd; the child gets it as stdout and
+    # stderr and the parent closes its copy once the child is spawned
     log_path = get_log_path(user_id, project_id)
-    log_file = open(log_path, 'a', encoding='utf-8', errors='replace')
-    log_file.write(f"\n{'='*60}\n")
-    log_file.write(f"Started at: {datetime.now()}\n")
-    log_file.write(f"{'='*60}\n\n")
-    log_file.flush()
+    log_fd = os.open(str(log_path), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
     
     try:
-        # Prepare command
-        if lang == 'py':
-            python_path = get_python_executable(user_id, project_id)
-            cmd = [str(python_path), str(entry_path)]
-        elif lang == 'js':
-            cmd = ['node', str(entry_path)]
+        header = f"\n{'='*60}\nStarted at: {datetime.now()}\n{'='*60}\n\n"
+        os.write(log_fd, header.encode('utf-8'))
+        
+        # Start process in its own process group so stop_process can
+        # signal the whole tree at once
+        if os.name == 'nt':
+            group_kwargs = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
         else:
-            log_file.close()
-            return False, f"❌ Unsupported language: {lang}"
+            group_kwargs = {'start_new_session': True}
         
-        # Start process
         process = subprocess.Popen(
             cmd,
             cwd=str(project_root),
-            stdout=log_file,
-            stderr=log_file,
-            text=True
+            stdout=log_fd,
+            stderr=subprocess.STDOUT,
+            **group_kwargs
         )
         
         # Store process info
-        running_processes[key] = RunningProcess(
+        _track_process(key, RunningProcess(
             user_id=user_id,
             project_id=project_id,
             entry_file=entry,
@@ -237,19 +380,53 @@ def start_process(user_id: int, project_id: int) -> Tuple[bool, str]:
             start_time=datetime.now(),
             log_path=log_path,
             auto_restart=bool(auto_restart)
-        )
+        ))
         
+        _prime_cpu_sampling(running_processes[key])
+        _watch_exit(running_processes[key])
         stat_increment('total_runs')
         
         return True, f"✅ <b>Started Successfully!</b>\n\n📦 Project: <b>{name}</b>\n🆔 PID: <code>{process.pid}</code>"
     
     except Exception as e:
         try:
-            log_file.write(f"\n❌ Start error: {e}\n")
-        except:
+            os.write(log_fd, f"\n❌ Start error: {e}\n".encode('utf-8', errors='replace'))
+        except OSError:
             pass
-        log_file.close()
         return False, f"❌ Failed to start: {e}"
+    finally:
+        os.close(log_fd)
+
+def _prime_cpu_sampling(proc_info: RunningProcess):
+    """Take a CPU baseline so later cpu_percent() calls need no interval"""
+    try:
+        proc_info.ps = psutil.Process(proc_info.process.pid)
+        proc_info.ps.cpu_percent(interval=None)
+    except psutil.Error:
+        proc_info.ps = None
+
+def _signal_group(process: subprocess.Popen, sig: int):
+    """Send a signal to the process and everything in its process group"""
+    try:
+        if os.name == 'nt':
+            # No process groups on Windows: walk the tree so the bot's own
+            # children don't outlive it. terminate() and kill() are both
+            # TerminateProcess there.
+            try:
+                children = psutil.Process(process.pid).children(recursive=True)
+            except psutil.Error:
+                children = []
+            for child in children:
+                try:
+                    child.kill()
+                except psutil.Error:
+                    pass
+            process.kill()
+        else:
+            # start_new_session makes the child the group leader (pgid == pid)
+            os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
 
 def stop_process(user_id: int, project_id: int) -> Tuple[bool, str]:
     """Stop a running process"""
@@ -264,65 +441,50 @@ def stop_process(user_id: int, project_id: int) -> Tuple[bool, str]:
     try:
         # Check if already stopped
         if process.poll() is not None:
-            del running_processes[key]
+            _untrack_process(key)
             return True, "✅ Process was already stopped"
         
-        # Try to terminate gracefully
-        parent = psutil.Process(process.pid)
-        children = parent.children(recursive=True)
-        
-        # Terminate children first
-        for child in children:
-            try:
-                child.terminate()
-            except:
-                pass
+        # Deliberate stop: keep the monitor from restarting it
+        proc_info.auto_restart = False
         
-        # Terminate parent
-        try:
-            parent.terminate()
-        except:
-            pass
+        # Try to terminate gracefully
+        _signal_group(process, signal.SIGTERM)
         
         # Wait for termination
         try:
-            parent.wait(timeout=5)
-        except psutil.TimeoutExpired:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
             # Force kill if still alive
-            for child in children:
-                try:
-                    child.kill()
-                except:
-                    pass
-            try:
-                parent.kill()
-            except:
-                pass
+            _signal_group(process, getattr(signal, 'SIGKILL', signal.SIGTERM))
+            process.wait(timeout=5)
         
-        del running_processes[key]
+        _untrack_process(key)
         return True, "✅ Process stopped"
     
     except Exception as e:
         return False, f"❌ Error stopping process: {e}"
 
-def restart_process(user_id: int, project_id: int) -> Tuple[bool, str]:
+async def restart_process(user_id: int, project_id: int) -> Tuple[bool, str]:
     """Restart a process"""
     key = make_key(user_id, project_id)
     
-    # Stop if running
+    # Stop if running; stop_process returns once the old process is reaped,
+    # so the new one can start right away
     if key in running_processes:
-        stop_ok, stop_msg = stop_process(user_id, project_id)
+        loop = asyncio.get_running_loop()
+        stop_ok, stop_msg = await loop.run_in_executor(None, stop_process, user_id, project_id)
         if not stop_ok:
             return False, stop_msg
-        
-        # Wait a bit
-        time.sleep(1)
     
     # Start again
     return start_process(user_id, project_id)
 
+# Seconds a get_process_stats() result is reused; cpu_percent(None) over a
+# shorter window is mostly noise anyway
+PROCESS_STATS_TTL = 1.5
+
 def get_process_stats(user_id: int, project_id: int) -> Optional[Dict]:
-    """Get process statistics"""
+    """Get process statistics (memoized for PROCESS_STATS_TTL seconds)"""
     key = make_key(user_id, project_id)
     
     if key not in running_processes:
@@ -331,14 +493,20 @@ def get_process_stats(user_id: int, project_id: int) -> Optional[Dict]:
     proc_info = running_processes[key]
     process = proc_info.process
     
-    if process.poll() is not None:
+    if not proc_info.alive:
         return None
     
+    now = time.monotonic()
+    if proc_info.stats_snapshot is not None and now < proc_info.stats_expires:
+        return proc_info.stats_snapshot
+    
     try:
-        ps = psutil.Process(process.pid)
+        if proc_info.ps is None:
+            _prime_cpu_sampling(proc_info)
+        ps = proc_info.ps
         
-        # Get CPU and memory
-        cpu_percent = ps.cpu_percent(interval=0.1)
+        # Get CPU (since the previous call) and memory
+        cpu_percent = ps.cpu_percent(interval=None)
         mem_info = ps.memory_info()
         mem_mb = mem_info.rss / (1024 * 1024)
         
@@ -346,7 +514,7 @@ def get_process_stats(user_id: int, project_id: int) -> Optional[Dict]:
         uptime = datetime.now() - proc_info.start_time
         uptime_str = str(uptime).split('.')[0]
         
-        return {
+        proc_info.stats_snapshot = {
             'status': '🟢 Running',
             'pid': process.pid,
             'cpu': f"{cpu_percent:.1f}%",
@@ -354,52 +522,160 @@ def get_process_stats(user_id: int, project_id: int) -> Optional[Dict]:
             'uptime': uptime_str,
             'restarts': proc_info.restart_count
         }
+        proc_info.stats_expires = now + PROCESS_STATS_TTL
+        return proc_info.stats_snapshot
     
     except:
         return None
 
+# Units of /proc/<pid>/stat CPU times and /proc/<pid>/statm sizes
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def _read_proc_file(path: str) -> bytes:
+    """Read a small /proc file with a single read()"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, 4096)
+    finally:
+        os.close(fd)
+
+def read_proc_stats(keys: list) -> Dict[str, Tuple[float, float]]:
+    """
+    Get (cpu_percent, rss_mb) for tracked processes in one /proc sweep
+    
+    CPU is averaged since the previous sweep (or since start on the first).
+    Returns an empty dict where /proc is not available.
+    """
+    result = {}
+    if not os.path.isdir("/proc"):
+        return result
+    
+    now = time.monotonic()
+    for key in keys:
+        proc_info = running_processes.get(key)
+        if proc_info is None:
+            continue
+        
+        pid = proc_info.process.pid
+        try:
+            stat = _read_proc_file(f"/proc/{pid}/stat")
+            statm = _read_proc_file(f"/proc/{pid}/statm")
+        except OSError:
+            continue
+        
+        # Fields after "(comm) "; utime and stime are fields 14 and 15
+        fields = stat[stat.rfind(b")") + 2:].split()
+        jiffies = int(fields[11]) + int(fields[12])
+        rss_mb = int(statm.split()[1]) * _PAGE_SIZE / (1024 * 1024)
+        
+        if proc_info.prev_sample_time:
+            elapsed = now - proc_info.prev_sample_time
+            used = jiffies - proc_info.prev_jiffies
+        else:
+            elapsed = (datetime.now() - proc_info.start_time).total_seconds()
+            used = jiffies
+        cpu = used / _CLK_TCK / elapsed * 100 if elapsed > 0 else 0.0
+        
+        proc_info.prev_jiffies = jiffies
+        proc_info.prev_sample_time = now
+        result[key] = (cpu, rss_mb)
+    
+    return result
+
+# Most bytes read_logs() looks at, so a log without newlines is never
+# copied out in full
+LOG_TAIL_MAX_BYTES = 256 * 1024
+
 def read_logs(user_id: int, project_id: int, lines: int = 50) -> str:
     """Read last N lines from log file"""
     log_path = get_log_path(user_id, project_id)
     
-    if not log_path.exists():
-        return "📝 No logs yet"
-    
     try:
         with open(log_path, 'rb') as f:
-            # Read from end
-            f.seek(0, os.SEEK_END)
-            size = f.tell()
-            block = 8192
-            data = b''
+            if os.fstat(f.fileno()).st_size == 0:
+                return "📝 Log is empty"
             
-            while size > 0 and data.count(b'\n') <= lines:
-                read_size = min(block, size)
-                size -= read_size
-                f.seek(size)
-                data = f.read(read_size) + data
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Walk back newline by newline; one extra covers a trailing newline
+                floor = max(0, len(mm) - LOG_TAIL_MAX_BYTES)
+                pos = len(mm)
+                for _ in range(lines + 1):
+                    pos = mm.rfind(b'\n', floor, pos)
+                    if pos < 0:
+                        pos = floor - 1
+                        break
+                data = mm[pos + 1:]
         
-        # Decode and get last lines
+        # Decode only the tail and get last lines
         text = data.decode(errors='replace')
         log_lines = text.splitlines()[-lines:]
         
         return '\n'.join(log_lines) if log_lines else "📝 Log is empty"
     
+    except FileNotFoundError:
+        return "📝 No logs yet"
     except Exception as e:
         return f"❌ Error reading logs: {e}"
 
+# =============================================================================
+# EXIT WATCHERS (Linux pidfd)
+# =============================================================================
+
+def _watch_exit(proc_info: RunningProcess):
+    """Wake the monitor as soon as the process exits (no-op without pidfd)"""
+    if _monitor_loop is None or not hasattr(os, "pidfd_open"):
+        return
+    _monitor_loop.call_soon_threadsafe(_add_exit_watcher, proc_info)
+
+def _add_exit_watcher(proc_info: RunningProcess):
+    """Register a pidfd reader for the process on the monitor loop"""
+    try:
+        fd = os.pidfd_open(proc_info.process.pid)
+    except OSError:
+        # Already gone or unsupported kernel, let the monitor poll it
+        _exit_event.set()
+        return
+    proc_info.pidfd = fd
+    _monitor_loop.add_reader(fd, _on_exit, proc_info)
+
+def _on_exit(proc_info: RunningProcess):
+    """pidfd became readable: the process has exited"""
+    proc_info.alive = False
+    fd = proc_info.pidfd
+    if fd is not None:
+        proc_info.pidfd = None
+        _monitor_loop.remove_reader(fd)
+        os.close(fd)
+    _exit_event.set()
+
+def _has_unwatched() -> bool:
+    """Check if any live process has no pidfd watcher and must be polled"""
+    return any(
+        p.alive and p.pidfd is None
+        for p in running_processes.values()
+    )
+
 async def auto_restart_monitor():
     """Monitor and auto-restart crashed processes"""
+    global _monitor_loop, _exit_event
+    _monitor_loop = asyncio.get_running_loop()
+    _exit_event = asyncio.Event()
+    for proc_info in running_processes.values():
+        _watch_exit(proc_info)
+    
     while True:
+        _exit_event.clear()
         try:
             for key, proc_info in list(running_processes.items()):
-                exit_code = proc_info.process.poll()
-                
-                # Still running
-                if exit_code is None:
-                    continue
+                # Watched processes are flagged by _on_exit; poll only the rest
+                if proc_info.alive:
+                    if proc_info.pidfd is not None or proc_info.process.poll() is None:
+                        continue
+                    proc_info.alive = False
                 
                 # Process exited
+                exit_code = proc_info.process.poll()
                 proc_info.last_exit_code = exit_code
                 
                 # Check if auto-restart enabled
@@ -423,8 +699,12 @@ async def auto_restart_monitor():
                 # Wait backoff time
                 await asyncio.sleep(backoff)
                 
+                # Stopped or restarted by the user meanwhile
+                if running_processes.get(key) is not proc_info:
+                    continue
+                
                 # Remove from dict
-                del running_processes[key]
+                _untrack_process(key)
                 
                 # Try to restart
                 success, msg = start_process(proc_info.user_id, proc_info.project_id)
@@ -438,19 +718,29 @@ async def auto_restart_monitor():
         except Exception as e:
             print(f"❌ Auto-restart monitor error: {e}")
         
-        await asyncio.sleep(AUTO_RESTART_CHECK_INTERVAL)
+        # Sleep until a watched process exits; poll only if some are unwatched
+        timeout = AUTO_RESTART_CHECK_INTERVAL if _has_unwatched() else None
+        try:
+            await asyncio.wait_for(_exit_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
 
 def get_all_running() -> list:
     """Get list of all running processes"""
     result = []
-    for key, proc_info in running_processes.items():
-        if proc_info.process.poll() is None:
+    now = datetime.now()
+    for key, proc_info in list(running_processes.items()):
+        if proc_info.alive:
             result.append({
                 'key': key,
                 'user_id': proc_info.user_id,
                 'project_id': proc_info.project_id,
                 'pid': proc_info.process.pid,
-                'uptime': str(datetime.now() - proc_info.start_time).split('.')[0],
+                'uptime': str(now - proc_info.start_time).split('.')[0],
                 'restarts': proc_info.restart_count
             })
-    return result
\ No newline at end of file
+    return result
+
+def running_count() -> int:
+    """Number of live processes, without building get_all_running() rows"""
+    return sum(1 for proc_info in list(running_processes.values()) if proc_info.alive)
\ No newline at end of file
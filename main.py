@@ -13,18 +13,33 @@ import asyncio
 import os
 import sys
 import shutil
+import sqlite3
+import signal
 import zipfile
 import logging
+import inspect
+import html
+import time
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
+from typing import Tuple, Optional, AsyncGenerator
 from aiohttp import web
 
+try:
+    import uvloop  # Optional faster event loop (not available on Windows)
+except ImportError:
+    uvloop = None
+
 from aiogram import Bot, Dispatcher, F, types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters import Command, CommandObject
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, BufferedInputFile
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, BufferedInputFile, InputFile
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
 
 # Import our modules
 from config import *
@@ -106,19 +121,87 @@ def format_bytes(bytes_num: int) -> str:
 
 def paginate(items: list, page: int, per_page: int = PAGINATION_PAGE_SIZE):
     """Paginate items"""
-    page = max(1, page)
     total = len(items)
-    pages = max(1, (total + per_page - 1) // per_page)
-    page = min(page, pages)
-    start = (page - 1) * per_page
-    end = start + per_page
-    return items[start:end], page, pages, total
+    page, pages, start = page_bounds(total, page, per_page)
+    return items[start:start + per_page], page, pages, total
 
 def safe_filename(name: str) -> str:
     """Sanitize filename"""
     name = name.replace("\\", "/").split("/")[-1]
     return "".join(ch for ch in name if ch.isalnum() or ch in "._-()[] ").strip() or "file"
 
+def read_text_head(path: Path, max_chars: int) -> Tuple[str, bool]:
+    """Read at most max_chars characters from the start of a file; returns (text, truncated)"""
+    with open(path, 'rb') as f:
+        # UTF-8 needs at most 4 bytes per character
+        data = f.read(max_chars * 4 + 1)
+    text = data.decode('utf-8', errors='replace')
+    truncated = len(text) > max_chars or len(data) > max_chars * 4
+    return text[:max_chars], truncated
+
+def write_new_project_file(user_id: int, pid: int, path: Path, data: bytes):
+    """Create the project directory if needed and write one file into it"""
+    get_project_root(user_id, pid)
+    path.write_bytes(data)
+
+async def download_document(doc: types.Document, file_path: Path, status_msg: types.Message) -> int:
+    """Stream a Telegram document to disk in chunks, editing status_msg with progress; returns bytes written"""
+    tg_file = await bot.get_file(doc.file_id)
+    url = bot.session.api.file_url(bot.token, tg_file.file_path)
+    
+    done = 0
+    last_edit = time.monotonic()
+    last_percent = None
+    with open(file_path, 'wb') as f:
+        async for chunk in bot.session.stream_content(url=url, chunk_size=UPLOAD_CHUNK_SIZE):
+            f.write(chunk)
+            done += len(chunk)
+            
+            # Telegram allows about one edit per second per chat
+            now = time.monotonic()
+            if doc.file_size and now - last_edit >= UPLOAD_PROGRESS_INTERVAL:
+                last_edit = now
+                percent = done * 100 // doc.file_size
+                if percent == last_percent:
+                    continue
+                last_percent = percent
+                
+                # Progress is cosmetic; a failed edit must not fail the upload
+                try:
+                    await status_msg.edit_text(f"⏳ Uploading... {percent}%")
+                except (TelegramBadRequest, TelegramRetryAfter):
+                    pass
+    
+    return done
+
+# A repeat of the same callback on the same message within this many seconds
+# (refresh button mashing) is acknowledged without re-rendering
+REFRESH_MIN_INTERVAL = 0.8
+# Most messages whose last render time is remembered
+REFRESH_TRACK_MAX = 4096
+# (chat_id, message_id) -> (monotonic time, callback data) of the last render
+_last_render: OrderedDict = OrderedDict()
+
+def refresh_too_soon(call: types.CallbackQuery) -> bool:
+    """Record this render; True if it repeats the previous one too quickly"""
+    key = (call.message.chat.id, call.message.message_id)
+    now = time.monotonic()
+    last = _last_render.get(key)
+    if last is not None and last[1] == call.data and now - last[0] < REFRESH_MIN_INTERVAL:
+        return True
+    _last_render[key] = (now, call.data)
+    _last_render.move_to_end(key)
+    if len(_last_render) > REFRESH_TRACK_MAX:
+        _last_render.popitem(last=False)
+    return False
+
+async def edit_if_changed(message: types.Message, text: str, reply_markup: InlineKeyboardMarkup):
+    """Edit an HTML message unless it already shows this text and keyboard"""
+    # Telegram trims the text and answers "message is not modified" after a full round trip
+    if message.reply_markup == reply_markup and message.html_text == text.strip():
+        return
+    await message.edit_text(text, reply_markup=reply_markup, parse_mode="HTML")
+
 def get_file_type(filename: str) -> str:
     """Get file type from extension"""
     ext = Path(filename).suffix.lower()
@@ -131,32 +214,38 @@ def get_file_type(filename: str) -> str:
     else:
         return 'other'
 
+# Limits per role; shared by every caller, so treat them as read-only
+OWNER_LIMITS = {
+    'files': OWNER_FILE_LIMIT,
+    'projects': OWNER_PROJECT_LIMIT,
+    'upload_mb': 1000
+}
+ADMIN_LIMITS = {
+    'files': ADMIN_FILE_LIMIT,
+    'projects': ADMIN_PROJECT_LIMIT,
+    'upload_mb': 200
+}
+PREMIUM_LIMITS = {
+    'files': SUBSCRIBED_USER_FILE_LIMIT,
+    'projects': SUBSCRIBED_USER_PROJECT_LIMIT,
+    'upload_mb': 100
+}
+FREE_LIMITS = {
+    'files': FREE_USER_FILE_LIMIT,
+    'projects': FREE_USER_PROJECT_LIMIT,
+    'upload_mb': MAX_UPLOAD_MB
+}
+
 def get_user_limits(user_id: int) -> dict:
-    """Get user limits based on role"""
+    """Get user limits based on role (role lookups are cached)"""
     if user_id == OWNER_ID:
-        return {
-            'files': OWNER_FILE_LIMIT,
-            'projects': OWNER_PROJECT_LIMIT,
-            'upload_mb': 1000
-        }
+        return OWNER_LIMITS
     elif is_admin(user_id):
-        return {
-            'files': ADMIN_FILE_LIMIT,
-            'projects': ADMIN_PROJECT_LIMIT,
-            'upload_mb': 200
-        }
+        return ADMIN_LIMITS
     elif is_premium(user_id):
-        return {
-            'files': SUBSCRIBED_USER_FILE_LIMIT,
-            'projects': SUBSCRIBED_USER_PROJECT_LIMIT,
-            'upload_mb': 100
-        }
+        return PREMIUM_LIMITS
     else:
-        return {
-            'files': FREE_USER_FILE_LIMIT,
-            'projects': FREE_USER_PROJECT_LIMIT,
-            'upload_mb': MAX_UPLOAD_MB
-        }
+        return FREE_LIMITS
 
 # =============================================================================
 # KEYBOARD BUILDERS
@@ -164,6 +253,11 @@ def get_user_limits(user_id: int) -> dict:
 
 def kb_main(user_id: int) -> InlineKeyboardMarkup:
     """Main menu keyboard"""
+    return _kb_main(is_admin(user_id))
+
+@lru_cache(maxsize=2)
+def _kb_main(with_admin: bool) -> InlineKeyboardMarkup:
+    """Build main menu keyboard"""
     buttons = [
         [
             InlineKeyboardButton(text="🚀 New Project", callback_data="project_create"),
@@ -183,19 +277,21 @@ def kb_main(user_id: int) -> InlineKeyboardMarkup:
         ]
     ]
     
-    if is_admin(user_id):
+    if with_admin:
         buttons.insert(3, [
             InlineKeyboardButton(text="👑 Admin Panel", callback_data="admin_panel")
         ])
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@lru_cache(maxsize=1)
 def kb_back_home() -> InlineKeyboardMarkup:
     """Back to home button"""
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🏠 Home", callback_data="home")]
     ])
 
+@lru_cache(maxsize=1024)
 def kb_confirm(action_yes: str, action_no: str = "home") -> InlineKeyboardMarkup:
     """Confirmation keyboard"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -205,41 +301,53 @@ def kb_confirm(action_yes: str, action_no: str = "home") -> InlineKeyboardMarkup
         ]
     ])
 
+def kb_nav_row(page: int, pages: int, callback_prefix: str) -> list:
+    """Pagination row (empty when everything fits on one page)"""
+    if pages <= 1:
+        return []
+    nav = [InlineKeyboardButton(text=f"📄 {page}/{pages}", callback_data="noop")]
+    if page > 1:
+        nav.insert(0, InlineKeyboardButton(text="⬅️", callback_data=f"{callback_prefix}{page-1}"))
+    if page < pages:
+        nav.append(InlineKeyboardButton(text="➡️", callback_data=f"{callback_prefix}{page+1}"))
+    return nav
+
 def kb_projects_list(projects: list, page: int, pages: int) -> InlineKeyboardMarkup:
     """Projects list keyboard"""
-    buttons = []
-    
-    for pid, name, entry, lang, auto_restart, desc in projects:
-        status = "⚙️" if not entry else "✅"
-        buttons.append([
-            InlineKeyboardButton(text=f"{status} {name[:25]}", callback_data=f"project:{pid}"),
+    buttons = [
+        [
+            InlineKeyboardButton(text=f"{'✅' if entry else '⚙️'} {name[:25]}", callback_data=f"project:{pid}"),
             InlineKeyboardButton(text="⚙️", callback_data=f"settings:{pid}")
-        ])
+        ]
+        for pid, name, entry, lang, auto_restart, desc in projects
+    ]
     
     # Pagination
-    nav = []
-    if pages > 1:
-        if page > 1:
-            nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"projects_page:{page-1}"))
-        nav.append(InlineKeyboardButton(text=f"📄 {page}/{pages}", callback_data="noop"))
-        if page < pages:
-            nav.append(InlineKeyboardButton(text="➡️", callback_data=f"projects_page:{page+1}"))
+    nav = kb_nav_row(page, pages, "projects_page:")
+    if nav:
         buttons.append(nav)
     
-    buttons.append([
-        InlineKeyboardButton(text="➕ Create New", callback_data="project_create")
-    ])
-    buttons.append([
-        InlineKeyboardButton(text="🏠 Home", callback_data="home")
+    buttons.extend([
+        [InlineKeyboardButton(text="➕ Create New", callback_data="project_create")],
+        [InlineKeyboardButton(text="🏠 Home", callback_data="home")]
     ])
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+def is_project_running(user_id: int, pid: int) -> bool:
+    """Check the cached liveness flag of a project's process"""
+    proc_info = running_processes.get(make_key(user_id, pid))
+    return proc_info is not None and proc_info.alive
+
+# The project/control keyboards depend only on (pid, is_running), so built
+# markups are reused across clicks
 def kb_project_menu(pid: int, user_id: int) -> InlineKeyboardMarkup:
     """Project menu keyboard"""
-    key = make_key(user_id, pid)
-    is_running = key in running_processes and running_processes[key].process.poll() is None
-    
+    return _kb_project_menu(pid, is_project_running(user_id, pid))
+
+@lru_cache(maxsize=2048)
+def _kb_project_menu(pid: int, is_running: bool) -> InlineKeyboardMarkup:
+    """Build project menu keyboard"""
     buttons = [
         [
             InlineKeyboardButton(text="📁 Files", callback_data=f"files:{pid}:1"),
@@ -271,9 +379,11 @@ def kb_project_menu(pid: int, user_id: int) -> InlineKeyboardMarkup:
 
 def kb_control_panel(pid: int, user_id: int) -> InlineKeyboardMarkup:
     """Control panel keyboard"""
-    key = make_key(user_id, pid)
-    is_running = key in running_processes and running_processes[key].process.poll() is None
-    
+    return _kb_control_panel(pid, is_project_running(user_id, pid))
+
+@lru_cache(maxsize=2048)
+def _kb_control_panel(pid: int, is_running: bool) -> InlineKeyboardMarkup:
+    """Build control panel keyboard"""
     buttons = []
     
     if is_running:
@@ -301,26 +411,25 @@ def kb_control_panel(pid: int, user_id: int) -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+FILE_TYPE_ICONS = {"py": "🐍", "js": "🟨"}
+CODE_FILE_TYPES = frozenset(FILE_TYPE_ICONS)
+
 def kb_files_list(pid: int, files: list, page: int, pages: int) -> InlineKeyboardMarkup:
     """Files list keyboard"""
-    buttons = []
-    
-    for fname, ftype, fsize, upload_date in files:
-        icon = "🐍" if ftype == "py" else "🟨" if ftype == "js" else "📄"
-        size_str = format_bytes(fsize)
-        buttons.append([
-            InlineKeyboardButton(text=f"{icon} {fname[:20]} ({size_str})", callback_data=f"file:{pid}:{fname}"),
+    buttons = [
+        [
+            InlineKeyboardButton(
+                text=f"{FILE_TYPE_ICONS.get(ftype, '📄')} {fname[:20]} ({format_bytes(fsize)})",
+                callback_data=f"file:{pid}:{fname}"
+            ),
             InlineKeyboardButton(text="⭐", callback_data=f"fav:{pid}:{fname}")
-        ])
+        ]
+        for fname, ftype, fsize, upload_date in files
+    ]
     
     # Pagination
-    nav = []
-    if pages > 1:
-        if page > 1:
-            nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"files:{pid}:{page-1}"))
-        nav.append(InlineKeyboardButton(text=f"📄 {page}/{pages}", callback_data="noop"))
-        if page < pages:
-            nav.append(InlineKeyboardButton(text="➡️", callback_data=f"files:{pid}:{page+1}"))
+    nav = kb_nav_row(page, pages, f"files:{pid}:")
+    if nav:
         buttons.append(nav)
     
     buttons.extend([
@@ -355,6 +464,30 @@ def kb_file_menu(pid: int, fname: str) -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@lru_cache(maxsize=1)
+def kb_templates_menu() -> InlineKeyboardMarkup:
+    """Template categories keyboard (TEMPLATES is static)"""
+    buttons = [
+        [InlineKeyboardButton(text=f"📁 {cat}", callback_data=f"tpl_cat:{cat}")]
+        for cat in TEMPLATE_CATEGORIES
+    ]
+    buttons.append([InlineKeyboardButton(text="🏠 Home", callback_data="home")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+@lru_cache(maxsize=64)
+def kb_template_category(category: str) -> InlineKeyboardMarkup:
+    """Templates in a category keyboard"""
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"{DIFFICULTY_ICONS.get(t['difficulty'], '🔴')} {t['title']}",
+            callback_data=f"tpl_view:{tid}"
+        )]
+        for tid, t in TEMPLATES_BY_CATEGORY.get(category, ())
+    ]
+    buttons.append([InlineKeyboardButton(text="⬅️ Back", callback_data="templates")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+@lru_cache(maxsize=1)
 def kb_admin_panel() -> InlineKeyboardMarkup:
     """Admin panel keyboard"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -382,41 +515,77 @@ def kb_admin_panel() -> InlineKeyboardMarkup:
         ]
     ])
 
+@lru_cache(maxsize=1)
+def kb_admin_back() -> InlineKeyboardMarkup:
+    """Back to admin panel button"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
+    ])
+
+@lru_cache(maxsize=16)
+def kb_cancel(action: str) -> InlineKeyboardMarkup:
+    """Single cancel button returning to a menu"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="❌ Cancel", callback_data=action)]
+    ])
+
+@lru_cache(maxsize=256)
+def kb_admin_users(page: int = 1, pages: int = 1) -> InlineKeyboardMarkup:
+    """Admin users list keyboard"""
+    nav = kb_nav_row(page, pages, "admin_users_page:")
+    return InlineKeyboardMarkup(inline_keyboard=[
+        *([nav] if nav else []),
+        [InlineKeyboardButton(text="🔍 Search User", callback_data="admin_search")],
+        [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
+    ])
+
+@lru_cache(maxsize=1)
+def kb_admin_analytics() -> InlineKeyboardMarkup:
+    """Admin analytics keyboard"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Refresh", callback_data="admin_analytics")],
+        [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
+    ])
+
+@lru_cache(maxsize=1)
+def kb_admin_premium() -> InlineKeyboardMarkup:
+    """Premium management keyboard"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="➕ Add Premium", callback_data="admin_add_premium")],
+        [InlineKeyboardButton(text="➖ Remove Premium", callback_data="admin_remove_premium")],
+        [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
+    ])
+
+@lru_cache(maxsize=1)
+def kb_admin_ban() -> InlineKeyboardMarkup:
+    """Ban management keyboard"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🚫 Ban User", callback_data="admin_ban_user")],
+        [InlineKeyboardButton(text="✅ Unban User", callback_data="admin_unban_user")],
+        [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
+    ])
+
 # =============================================================================
 # UI TEXT GENERATORS
 # =============================================================================
 
-def ui_home_text(user: types.User) -> str:
-    """Generate beautiful home screen text"""
-    stats = get_user_stats(user.id)
-    limits = get_user_limits(user.id)
-    
-    # Status badge
-    if user.id == OWNER_ID:
-        badge = "👑 <b>OWNER</b>"
-    elif stats['is_admin']:
-        badge = "👑 <b>ADMIN</b>"
-    elif stats['is_premium']:
-        badge = "💎 <b>PREMIUM</b>"
-    else:
-        badge = "🆓 <b>FREE</b>"
-    
-    return f"""
+# Home screen layout; only the user fields are filled in per call
+HOME_TEMPLATE = """
 ┏━━━━━━━━━━━━━━━━━━━━━━━━━━┓
 ┃   ✨ <b>ADVANCED BOT HOSTING</b> ✨
 ┃   <i>Professional Cloud Platform</i>
 ┗━━━━━━━━━━━━━━━━━━━━━━━━━━┛
 
 👤 <b>User Profile</b>
-├ Name: <b>{user.full_name}</b>
-├ ID: <code>{user.id}</code>
+├ Name: <b>{name}</b>
+├ ID: <code>{uid}</code>
 ├ Status: {badge}
-└ Member Since: <code>{stats['join_date'][:10] if stats['join_date'] else 'Unknown'}</code>
+└ Member Since: <code>{joined}</code>
 
 📊 <b>Your Statistics</b>
-├ 📦 Projects: <b>{stats['project_count']}/{limits['projects']}</b>
-├ 📁 Files: <b>{stats['file_count']}/{limits['files']}</b>
-└ 💾 Upload Limit: <b>{limits['upload_mb']} MB</b>
+├ 📦 Projects: <b>{project_count}/{project_limit}</b>
+├ 📁 Files: <b>{file_count}/{file_limit}</b>
+└ 💾 Upload Limit: <b>{upload_mb} MB</b>
 
 ⚡ <b>Quick Actions</b>
 • Create new project from scratch
@@ -427,6 +596,50 @@ def ui_home_text(user: types.User) -> str:
 💡 <i>Tip: Use templates for instant deployment!</i>
 """
 
+@lru_cache(maxsize=4096)
+def _render_home(name: str, uid: int, badge: str, joined: str,
+                 project_count: int, project_limit: int,
+                 file_count: int, file_limit: int, upload_mb: int) -> str:
+    """Format HOME_TEMPLATE, memoized on every value it shows"""
+    return HOME_TEMPLATE.format(
+        name=name,
+        uid=uid,
+        badge=badge,
+        joined=joined,
+        project_count=project_count,
+        project_limit=project_limit,
+        file_count=file_count,
+        file_limit=file_limit,
+        upload_mb=upload_mb
+    )
+
+async def ui_home_text(user: types.User) -> str:
+    """Generate beautiful home screen text"""
+    stats = await db_read(get_user_stats, user.id)
+    limits = await db_read(get_user_limits, user.id)
+    
+    # Status badge
+    if user.id == OWNER_ID:
+        badge = "👑 <b>OWNER</b>"
+    elif stats['is_admin']:
+        badge = "👑 <b>ADMIN</b>"
+    elif stats['is_premium']:
+        badge = "💎 <b>PREMIUM</b>"
+    else:
+        badge = "🆓 <b>FREE</b>"
+    
+    return _render_home(
+        user.full_name,
+        user.id,
+        badge,
+        stats['join_date'][:10] if stats['join_date'] else 'Unknown',
+        stats['project_count'],
+        limits['projects'],
+        stats['file_count'],
+        limits['files'],
+        limits['upload_mb']
+    )
+
 # =============================================================================
 # COMMAND HANDLERS
 # =============================================================================
@@ -434,7 +647,7 @@ def ui_home_text(user: types.User) -> str:
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
     """Start command"""
-    ensure_user(message.from_user.id, message.from_user.username, message.from_user.full_name)
+    await db_write(ensure_user, message.from_user.id, message.from_user.username, message.from_user.full_name)
     
     if is_banned(message.from_user.id):
         await message.answer(
@@ -446,7 +659,7 @@ async def cmd_start(message: types.Message):
         return
     
     await message.answer(
-        ui_home_text(message.from_user),
+        await ui_home_text(message.from_user),
         reply_markup=kb_main(message.from_user.id),
         parse_mode="HTML"
     )
@@ -454,13 +667,13 @@ async def cmd_start(message: types.Message):
 @dp.message(Command("install"))
 async def cmd_install(message: types.Message, command: CommandObject):
     """Install package command"""
-    ensure_user(message.from_user.id, message.from_user.username, message.from_user.full_name)
+    await db_write(ensure_user, message.from_user.id, message.from_user.username, message.from_user.full_name)
     
     if is_banned(message.from_user.id):
         return
     
     # Get active project
-    stats = get_user_stats(message.from_user.id)
+    stats = await db_read(get_user_stats, message.from_user.id)
     active_pid = stats['active_project_id']
     
     if not active_pid:
@@ -488,14 +701,16 @@ async def cmd_install(message: types.Message, command: CommandObject):
     
     package_name = command.args.strip()
     
+    queued = install_queue_position()
     status_msg = await message.answer(
         f"⏳ Installing <code>{package_name}</code>...\n\n"
-        "This may take a minute...",
+        + (f"Queued behind <b>{queued}</b> other install(s).\n" if queued else "")
+        + "This may take a minute...",
         parse_mode="HTML"
     )
     
     # Install package
-    success, msg = install_package(message.from_user.id, active_pid, package_name)
+    success, msg = await install_package(message.from_user.id, active_pid, package_name)
     
     if success:
         await status_msg.edit_text(
@@ -524,13 +739,13 @@ async def cmd_userinfo(message: types.Message, command: CommandObject):
         )
         return
     
-    try:
-        user_id = int(command.args)
-    except:
+    arg = command.args.strip()
+    if not arg.removeprefix("-").isdigit():
         await message.answer("Invalid user ID")
         return
+    user_id = int(arg)
     
-    stats = get_user_stats(user_id)
+    stats = await db_read(get_user_stats, user_id)
     
     status_badges = []
     if stats['is_admin']:
@@ -556,6 +771,85 @@ async def cmd_userinfo(message: types.Message, command: CommandObject):
     
     await message.answer(text, parse_mode="HTML")
 
+# =============================================================================
+# CALLBACK ACKS
+# =============================================================================
+
+# Plain callback acknowledgements are queued and sent by ack_worker() so a
+# handler never waits on that round trip. Callbacks answered with text or
+# an alert still call call.answer() directly.
+_ack_queue: asyncio.Queue = asyncio.Queue()
+# Max acknowledgements taken from the queue per batch
+ACK_BATCH_SIZE = 50
+# Max answerCallbackQuery requests in flight at once
+ACK_CONCURRENCY = 20
+
+def ack(call: types.CallbackQuery):
+    """Queue a plain answer for a callback query"""
+    _ack_queue.put_nowait(call.id)
+
+async def ack_worker():
+    """Answer queued callback queries in concurrent batches"""
+    sem = asyncio.Semaphore(ACK_CONCURRENCY)
+    
+    async def answer_one(callback_id: str):
+        async with sem:
+            try:
+                await bot.answer_callback_query(callback_id)
+            except Exception:
+                # Expired or already answered; nothing left to do
+                pass
+    
+    while True:
+        batch = [await _ack_queue.get()]
+        while len(batch) < ACK_BATCH_SIZE:
+            try:
+                batch.append(_ack_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        await asyncio.gather(*(answer_one(cid) for cid in batch))
+
+# =============================================================================
+# CALLBACK ROUTING
+# =============================================================================
+
+# "verb:args" callbacks are dispatched with one dict lookup on the verb
+# instead of aiogram testing a startswith() filter per handler.
+# verb -> (handler, handler takes FSM state, exclusive)
+CB_ROUTES: dict = {}
+
+# (user_id, callback data) of exclusive callbacks still being handled, so a
+# double tap does not delete, export or install the same thing twice
+_cb_inflight: set = set()
+
+def cb_route(verb: str, exclusive: bool = False):
+    """Register a handler for callbacks whose data is "verb:..." """
+    def decorator(handler):
+        CB_ROUTES[verb] = (handler, "state" in inspect.signature(handler).parameters, exclusive)
+        return handler
+    return decorator
+
+@dp.callback_query(F.data.func(lambda data: data.partition(":")[0] in CB_ROUTES))
+async def cb_router(call: types.CallbackQuery, state: FSMContext):
+    """Dispatch routed callbacks"""
+    handler, wants_state, exclusive = CB_ROUTES[call.data.partition(":")[0]]
+    
+    key = (call.from_user.id, call.data)
+    if exclusive:
+        if key in _cb_inflight:
+            await call.answer("⏳ Already in progress...")
+            return
+        _cb_inflight.add(key)
+    
+    try:
+        if wants_state:
+            await handler(call, state)
+        else:
+            await handler(call)
+    finally:
+        if exclusive:
+            _cb_inflight.discard(key)
+
 # =============================================================================
 # CALLBACK HANDLERS - HOME & NAVIGATION
 # =============================================================================
@@ -563,24 +857,17 @@ async def cmd_userinfo(message: types.Message, command: CommandObject):
 @dp.callback_query(F.data == "home")
 async def cb_home(call: types.CallbackQuery):
     """Home button"""
-    ensure_user(call.from_user.id, call.from_user.username, call.from_user.full_name)
+    await db_write(ensure_user, call.from_user.id, call.from_user.username, call.from_user.full_name)
     
-    await call.message.edit_text(
-        ui_home_text(call.from_user),
-        reply_markup=kb_main(call.from_user.id),
-        parse_mode="HTML"
-    )
-    await call.answer()
+    await edit_if_changed(call.message, await ui_home_text(call.from_user), kb_main(call.from_user.id))
+    ack(call)
 
 @dp.callback_query(F.data == "noop")
 async def cb_noop(call: types.CallbackQuery):
     """No operation"""
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data == "help")
-async def cb_help(call: types.CallbackQuery):
-    """Help screen"""
-    text = """
+HELP_TEXT = """
 <b>❓ Help & Guide</b>
 
 <b>🚀 Getting Started:</b>
@@ -631,24 +918,28 @@ async def cb_help(call: types.CallbackQuery):
 • /userinfo USER_ID - User info (admin only)
 
 Need help? Contact: """ + YOUR_USERNAME
-    
+
+@dp.callback_query(F.data == "help")
+async def cb_help(call: types.CallbackQuery):
+    """Help screen"""
     await call.message.edit_text(
-        text,
+        HELP_TEXT,
         reply_markup=kb_back_home(),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
 @dp.callback_query(F.data == "my_stats")
 async def cb_my_stats(call: types.CallbackQuery):
     """User statistics"""
-    stats = get_user_stats(call.from_user.id)
+    stats, all_stats = await asyncio.gather(
+        db_read(get_user_stats, call.from_user.id),
+        db_read(get_all_stats)
+    )
     limits = get_user_limits(call.from_user.id)
-    all_stats = get_all_stats()
     
     # Count running bots
-    running_count = sum(1 for k in running_processes.keys() 
-                       if k.startswith(f"{call.from_user.id}:"))
+    running_count = count_user_running(call.from_user.id)
     
     text = f"""
 <b>📊 Your Statistics</b>
@@ -675,7 +966,7 @@ async def cb_my_stats(call: types.CallbackQuery):
         reply_markup=kb_back_home(),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
 # =============================================================================
 # CALLBACK HANDLERS - PROJECTS
@@ -684,9 +975,9 @@ async def cb_my_stats(call: types.CallbackQuery):
 @dp.callback_query(F.data == "projects")
 async def cb_projects(call: types.CallbackQuery):
     """Projects list"""
-    projects = list_projects(call.from_user.id)
+    page_items, page, pages, total = await db_read(list_projects_page, call.from_user.id, 1)
     
-    if not projects:
+    if not total:
         text = """
 <b>📦 Your Projects</b>
 
@@ -699,18 +990,16 @@ You don't have any projects yet.
 
 💡 Templates are the fastest way to get started!
 """
-        await call.message.edit_text(
+        await edit_if_changed(
+            call.message,
             text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="➕ Create Project", callback_data="project_create")],
                 [InlineKeyboardButton(text="🛍️ Browse Templates", callback_data="templates")],
                 [InlineKeyboardButton(text="🏠 Home", callback_data="home")]
-            ]),
-            parse_mode="HTML"
+            ])
         )
     else:
-        page_items, page, pages, total = paginate(projects, 1)
-        
         text = f"""
 <b>📦 Your Projects</b>
 
@@ -720,20 +1009,15 @@ Page: <b>{page}/{pages}</b>
 Select a project to manage:
 """
         
-        await call.message.edit_text(
-            text,
-            reply_markup=kb_projects_list(page_items, page, pages),
-            parse_mode="HTML"
-        )
+        await edit_if_changed(call.message, text, kb_projects_list(page_items, page, pages))
     
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("projects_page:"))
+@cb_route("projects_page")
 async def cb_projects_page(call: types.CallbackQuery):
     """Projects pagination"""
     page = int(call.data.split(":")[1])
-    projects = list_projects(call.from_user.id)
-    page_items, page, pages, total = paginate(projects, page)
+    page_items, page, pages, total = await db_read(list_projects_page, call.from_user.id, page)
     
     text = f"""
 <b>📦 Your Projects</b>
@@ -749,13 +1033,13 @@ Select a project to manage:
         reply_markup=kb_projects_list(page_items, page, pages),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
 @dp.callback_query(F.data == "project_create")
 async def cb_project_create(call: types.CallbackQuery, state: FSMContext):
     """Start project creation"""
     limits = get_user_limits(call.from_user.id)
-    stats = get_user_stats(call.from_user.id)
+    stats = await db_read(get_user_stats, call.from_user.id)
     
     if stats['project_count'] >= limits['projects']:
         await call.answer(
@@ -777,7 +1061,7 @@ async def cb_project_create(call: types.CallbackQuery, state: FSMContext):
         parse_mode="HTML",
         reply_markup=kb_back_home()
     )
-    await call.answer()
+    ack(call)
 
 @dp.message(ProjectCreate.name)
 async def fsm_project_name(message: types.Message, state: FSMContext):
@@ -814,23 +1098,25 @@ async def fsm_project_description(message: types.Message, state: FSMContext):
     
     # Create project
     try:
-        pid = create_project(message.from_user.id, name, description)
+        pid = await db_write(create_project, message.from_user.id, name, description)
         
-        # Create README
-        project_root = get_project_root(message.from_user.id, pid)
-        readme = project_root / "README.md"
-        readme.write_text(
+        # Create README; its size is known up front, so the file write and
+        # the files row go out together
+        readme_bytes = (
             f"# {name}\n\n"
             f"{description}\n\n"
             "## Getting Started\n\n"
             "1. Upload your files\n"
             "2. Set entry file in Settings\n"
             "3. Install dependencies\n"
-            "4. Start your bot!\n",
-            encoding='utf-8'
-        )
+            "4. Start your bot!\n"
+        ).encode('utf-8')
+        readme = project_root_path(message.from_user.id, pid) / "README.md"
         
-        add_file(message.from_user.id, pid, "README.md", "text", readme.stat().st_size)
+        await asyncio.gather(
+            asyncio.to_thread(write_new_project_file, message.from_user.id, pid, readme, readme_bytes),
+            db_write(add_file, message.from_user.id, pid, "README.md", "text", len(readme_bytes))
+        )
         
         await state.clear()
         
@@ -855,30 +1141,23 @@ async def fsm_project_description(message: types.Message, state: FSMContext):
         )
         await state.clear()
 
-@dp.callback_query(F.data.startswith("project:"))
+@cb_route("project")
 async def cb_project_open(call: types.CallbackQuery):
     """Open project menu"""
     pid = int(call.data.split(":")[1])
     
-    project = get_project(call.from_user.id, pid)
+    # Project row with file count and total size in one query
+    project = await db_read(get_project_with_file_stats, call.from_user.id, pid)
     if not project:
         await call.answer("❌ Project not found", show_alert=True)
         return
     
-    _, name, entry, lang, auto_restart, desc, created = project
-    
-    # Get file count
-    files = list_files(call.from_user.id, pid)
-    file_count = len(files)
+    _, name, entry, lang, auto_restart, desc, created, file_count, total_size = project
     
     # Check if running
-    key = make_key(call.from_user.id, pid)
-    is_running = key in running_processes and running_processes[key].process.poll() is None
+    is_running = is_project_running(call.from_user.id, pid)
     status = "🟢 Running" if is_running else "🔴 Stopped"
     
-    # Get total size
-    total_size = sum(f[2] for f in files)
-    
     text = f"""
 <b>📦 Project: {name}</b>
 
@@ -900,14 +1179,14 @@ async def cb_project_open(call: types.CallbackQuery):
         reply_markup=kb_project_menu(pid, call.from_user.id),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("delete_ask:"))
+@cb_route("delete_ask")
 async def cb_delete_ask(call: types.CallbackQuery):
     """Ask for delete confirmation"""
     pid = int(call.data.split(":")[1])
     
-    project = get_project(call.from_user.id, pid)
+    project = await db_read(get_project, call.from_user.id, pid)
     if not project:
         await call.answer("❌ Project not found", show_alert=True)
         return
@@ -926,9 +1205,9 @@ async def cb_delete_ask(call: types.CallbackQuery):
         parse_mode="HTML",
         reply_markup=kb_confirm(f"delete_confirm:{pid}", f"project:{pid}")
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("delete_confirm:"))
+@cb_route("delete_confirm", exclusive=True)
 async def cb_delete_confirm(call: types.CallbackQuery):
     """Confirm project deletion"""
     pid = int(call.data.split(":")[1])
@@ -936,15 +1215,15 @@ async def cb_delete_confirm(call: types.CallbackQuery):
     # Stop if running
     key = make_key(call.from_user.id, pid)
     if key in running_processes:
-        stop_process(call.from_user.id, pid)
+        await asyncio.to_thread(stop_process, call.from_user.id, pid)
     
-    # Delete from filesystem
-    project_root = get_project_root(call.from_user.id, pid)
-    if project_root.exists():
-        shutil.rmtree(project_root, ignore_errors=True)
+    # Delete from filesystem (off the event loop, projects can be large)
+    project_root = project_root_path(call.from_user.id, pid)
+    await asyncio.to_thread(shutil.rmtree, project_root, ignore_errors=True)
+    forget_project_root(call.from_user.id, pid)
     
     # Delete from database
-    delete_project(call.from_user.id, pid)
+    await db_write(delete_project, call.from_user.id, pid)
     
     await call.message.edit_text(
         "✅ <b>Project Deleted</b>\n\n"
@@ -955,30 +1234,34 @@ async def cb_delete_confirm(call: types.CallbackQuery):
             [InlineKeyboardButton(text="🏠 Home", callback_data="home")]
         ])
     )
-    await call.answer()
+    ack(call)
 
 # =============================================================================
 # CALLBACK HANDLERS - SETTINGS
 # =============================================================================
 
-@dp.callback_query(F.data.startswith("settings:"))
+@cb_route("settings")
 async def cb_settings(call: types.CallbackQuery):
     """Project settings"""
     pid = int(call.data.split(":")[1])
     
-    project = get_project(call.from_user.id, pid)
+    project = await db_read(get_project, call.from_user.id, pid)
     if not project:
         await call.answer("❌ Project not found", show_alert=True)
         return
     
     _, name, entry, lang, auto_restart, desc, _ = project
     
-    # List available files
-    files = list_files(call.from_user.id, pid)
-    py_files = [f[0] for f in files if f[1] == 'py']
-    js_files = [f[0] for f in files if f[1] == 'js']
+    # List available code files
+    code_files = await db_read(list_code_files, call.from_user.id, pid)
+    py_files, js_files = [], []
+    for fname, ftype in code_files:
+        if ftype == 'py':
+            py_files.append(fname)
+        elif ftype == 'js':
+            js_files.append(fname)
     
-    text = f"""
+    parts = [f"""
 <b>⚙️ Project Settings</b>
 
 <b>Project:</b> {name}
@@ -990,17 +1273,18 @@ async def cb_settings(call: types.CallbackQuery):
 └ Auto-restart: <b>{'✅ Enabled' if auto_restart else '❌ Disabled'}</b>
 
 <b>Available Files:</b>
-"""
+"""]
     
     if py_files:
-        text += f"\n🐍 Python: {', '.join(py_files[:5])}"
+        parts.append(f"\n🐍 Python: {', '.join(py_files[:5])}")
     if js_files:
-        text += f"\n🟨 JavaScript: {', '.join(js_files[:5])}"
+        parts.append(f"\n🟨 JavaScript: {', '.join(js_files[:5])}")
     
     if not py_files and not js_files:
-        text += "\n<i>No code files uploaded yet</i>"
+        parts.append("\n<i>No code files uploaded yet</i>")
     
-    text += "\n\n💡 Click a button below to configure:"
+    parts.append("\n\n💡 Click a button below to configure:")
+    text = "".join(parts)
     
     buttons = [
         [InlineKeyboardButton(text="📝 Set Entry File", callback_data=f"set_entry:{pid}")],
@@ -1013,16 +1297,15 @@ async def cb_settings(call: types.CallbackQuery):
         reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("set_entry:"))
+@cb_route("set_entry")
 async def cb_set_entry(call: types.CallbackQuery, state: FSMContext):
     """Set entry file"""
     pid = int(call.data.split(":")[1])
     
     # List code files
-    files = list_files(call.from_user.id, pid)
-    code_files = [f for f in files if f[1] in ['py', 'js']]
+    code_files = await db_read(list_code_files, call.from_user.id, pid)
     
     if not code_files:
         await call.answer(
@@ -1034,7 +1317,7 @@ async def cb_set_entry(call: types.CallbackQuery, state: FSMContext):
     await state.update_data(project_id=pid)
     await state.set_state(ProjectSettings.entry_file)
     
-    files_list = "\n".join([f"• <code>{f[0]}</code> ({f[1].upper()})" for f in code_files])
+    files_list = "\n".join(f"• <code>{fname}</code> ({ftype.upper()})" for fname, ftype in code_files)
     
     await call.message.edit_text(
         f"<b>📝 Set Entry File</b>\n\n"
@@ -1046,7 +1329,7 @@ async def cb_set_entry(call: types.CallbackQuery, state: FSMContext):
             [InlineKeyboardButton(text="❌ Cancel", callback_data=f"settings:{pid}")]
         ])
     )
-    await call.answer()
+    ack(call)
 
 @dp.message(ProjectSettings.entry_file)
 async def fsm_set_entry(message: types.Message, state: FSMContext):
@@ -1056,7 +1339,7 @@ async def fsm_set_entry(message: types.Message, state: FSMContext):
     entry = message.text.strip()
     
     # Check if file exists
-    files = list_files(message.from_user.id, pid)
+    files = await db_read(list_files, message.from_user.id, pid)
     file_exists = any(f[0] == entry for f in files)
     
     if not file_exists:
@@ -1069,7 +1352,7 @@ async def fsm_set_entry(message: types.Message, state: FSMContext):
     
     # Determine language
     lang = get_file_type(entry)
-    if lang not in ['py', 'js']:
+    if lang not in CODE_FILE_TYPES:
         await message.answer(
             "❌ File must be .py or .js\n"
             "Please send again:"
@@ -1077,10 +1360,10 @@ async def fsm_set_entry(message: types.Message, state: FSMContext):
         return
     
     # Update settings
-    project = get_project(message.from_user.id, pid)
+    project = await db_read(get_project, message.from_user.id, pid)
     auto_restart = project[4] if project else 0
     
-    update_project_settings(message.from_user.id, pid, entry, lang, auto_restart)
+    await db_write(update_project_settings, message.from_user.id, pid, entry, lang, auto_restart)
     
     await state.clear()
     
@@ -1093,12 +1376,12 @@ async def fsm_set_entry(message: types.Message, state: FSMContext):
         reply_markup=kb_project_menu(pid, message.from_user.id)
     )
 
-@dp.callback_query(F.data.startswith("toggle_restart:"))
+@cb_route("toggle_restart")
 async def cb_toggle_restart(call: types.CallbackQuery):
     """Toggle auto-restart"""
     pid = int(call.data.split(":")[1])
     
-    project = get_project(call.from_user.id, pid)
+    project = await db_read(get_project, call.from_user.id, pid)
     if not project:
         await call.answer("❌ Project not found", show_alert=True)
         return
@@ -1107,7 +1390,7 @@ async def cb_toggle_restart(call: types.CallbackQuery):
     
     # Toggle
     new_value = 0 if auto_restart else 1
-    update_project_settings(call.from_user.id, pid, entry, lang, new_value)
+    await db_write(update_project_settings, call.from_user.id, pid, entry, lang, new_value)
     
     await call.answer(
         f"✅ Auto-restart {'enabled' if new_value else 'disabled'}",
@@ -1121,36 +1404,30 @@ async def cb_toggle_restart(call: types.CallbackQuery):
 # CALLBACK HANDLERS - FILES
 # =============================================================================
 
-@dp.callback_query(F.data.startswith("files:"))
+@cb_route("files")
 async def cb_files(call: types.CallbackQuery):
     """Files list"""
     parts = call.data.split(":")
     pid = int(parts[1])
     page = int(parts[2]) if len(parts) > 2 else 1
     
-    files = list_files(call.from_user.id, pid)
+    project = await db_read(get_project_with_file_stats, call.from_user.id, pid)
+    name = project[1] if project else "Unknown"
     
-    if not files:
-        project = get_project(call.from_user.id, pid)
-        name = project[1] if project else "Unknown"
-        
-        await call.message.edit_text(
+    if not project or not project[7]:
+        await edit_if_changed(
+            call.message,
             f"<b>📁 Files: {name}</b>\n\n"
             f"No files uploaded yet.\n\n"
             f"Click the button below to upload files.",
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="📤 Upload File", callback_data=f"upload_to:{pid}")],
                 [InlineKeyboardButton(text="⬅️ Back", callback_data=f"project:{pid}")]
             ])
         )
     else:
-        page_items, page, pages, total = paginate(files, page)
-        
-        project = get_project(call.from_user.id, pid)
-        name = project[1] if project else "Unknown"
-        
-        total_size = sum(f[2] for f in files)
+        page_items, page, pages, total = await db_read(list_files_page, call.from_user.id, pid, page)
+        total_size = project[8]
         
         text = f"""
 <b>📁 Files: {name}</b>
@@ -1161,30 +1438,27 @@ Page: <b>{page}/{pages}</b>
 Select a file to manage:
 """
         
-        await call.message.edit_text(
-            text,
-            reply_markup=kb_files_list(pid, page_items, page, pages),
-            parse_mode="HTML"
-        )
+        await edit_if_changed(call.message, text, kb_files_list(pid, page_items, page, pages))
     
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("file:"))
+@cb_route("file")
 async def cb_file_open(call: types.CallbackQuery):
     """Open file menu"""
     parts = call.data.split(":", 2)
     pid = int(parts[1])
     fname = parts[2]
     
-    project_root = get_project_root(call.from_user.id, pid)
+    project_root = project_root_path(call.from_user.id, pid)
     file_path = project_root / fname
     
-    if not file_path.exists():
+    # Get file info
+    try:
+        size = (await asyncio.to_thread(file_path.stat)).st_size
+    except FileNotFoundError:
         await call.answer("❌ File not found", show_alert=True)
         return
     
-    # Get file info
-    size = file_path.stat().st_size
     ftype = get_file_type(fname)
     
     text = f"""
@@ -1202,30 +1476,25 @@ Select an action:
         reply_markup=kb_file_menu(pid, fname),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("view:"))
+@cb_route("view")
 async def cb_view_file(call: types.CallbackQuery):
     """View file contents"""
     parts = call.data.split(":", 2)
     pid = int(parts[1])
     fname = parts[2]
     
-    project_root = get_project_root(call.from_user.id, pid)
+    project_root = project_root_path(call.from_user.id, pid)
     file_path = project_root / fname
     
-    if not file_path.exists():
-        await call.answer("❌ File not found", show_alert=True)
-        return
-    
     try:
-        content = file_path.read_text(encoding='utf-8', errors='replace')
+        # Only the part that will be shown is read
+        content, truncated = await asyncio.to_thread(read_text_head, file_path, MAX_FILE_VIEW_CHARS)
+        if truncated:
+            content += "\n\n... (truncated)"
         
-        # Truncate if too long
-        if len(content) > MAX_FILE_VIEW_CHARS:
-            content = content[:MAX_FILE_VIEW_CHARS] + "\n\n... (truncated)"
-        
-        text = f"<b>📄 {fname}</b>\n\n<pre>{content}</pre>"
+        text = f"<b>📄 {html.escape(fname)}</b>\n\n<pre>{html.escape(content)}</pre>"
         
         await call.message.edit_text(
             text,
@@ -1234,19 +1503,21 @@ async def cb_view_file(call: types.CallbackQuery):
             ]),
             parse_mode="HTML"
         )
+    except FileNotFoundError:
+        await call.answer("❌ File not found", show_alert=True)
     except Exception as e:
         await call.answer(f"❌ Error reading file: {e}", show_alert=True)
     
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("download:"))
+@cb_route("download", exclusive=True)
 async def cb_download_file(call: types.CallbackQuery):
     """Download file"""
     parts = call.data.split(":", 2)
     pid = int(parts[1])
     fname = parts[2]
     
-    project_root = get_project_root(call.from_user.id, pid)
+    project_root = project_root_path(call.from_user.id, pid)
     file_path = project_root / fname
     
     if not file_path.exists():
@@ -1267,9 +1538,9 @@ async def cb_download_file(call: types.CallbackQuery):
     except Exception as e:
         await call.message.answer(f"❌ Download failed: {e}")
     
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("delete_file_ask:"))
+@cb_route("delete_file_ask")
 async def cb_delete_file_ask(call: types.CallbackQuery):
     """Ask to delete file"""
     parts = call.data.split(":", 2)
@@ -1288,22 +1559,21 @@ async def cb_delete_file_ask(call: types.CallbackQuery):
             ]
         ])
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("delete_file_confirm:"))
+@cb_route("delete_file_confirm", exclusive=True)
 async def cb_delete_file_confirm(call: types.CallbackQuery):
     """Confirm file deletion"""
     parts = call.data.split(":", 2)
     pid = int(parts[1])
     fname = parts[2]
     
-    project_root = get_project_root(call.from_user.id, pid)
+    project_root = project_root_path(call.from_user.id, pid)
     file_path = project_root / fname
     
-    if file_path.exists():
-        file_path.unlink()
+    await asyncio.to_thread(file_path.unlink, missing_ok=True)
     
-    remove_file(call.from_user.id, pid, fname)
+    await db_write(remove_file, call.from_user.id, pid, fname)
     
     await call.message.edit_text(
         f"✅ <b>File Deleted</b>\n\n"
@@ -1313,53 +1583,72 @@ async def cb_delete_file_confirm(call: types.CallbackQuery):
             [InlineKeyboardButton(text="📁 Back to Files", callback_data=f"files:{pid}:1")]
         ])
     )
-    await call.answer()
+    ack(call)
 
 # =============================================================================
 # CALLBACK HANDLERS - UPLOAD
 # =============================================================================
 
 @dp.callback_query(F.data == "upload")
-async def cb_upload(call: types.CallbackQuery):
+async def cb_upload(call: types.CallbackQuery, state: FSMContext):
     """Upload file (no project selected)"""
-    stats = get_user_stats(call.from_user.id)
+    stats = await db_read(get_user_stats, call.from_user.id)
     active_pid = stats['active_project_id']
     
-    if not active_pid:
-        projects = list_projects(call.from_user.id)
-        if not projects:
-            await call.answer(
-                "❌ Create a project first!",
-                show_alert=True
-            )
-            return
-        
-        # Show project selection
-        buttons = []
-        for pid, name, _, _, _, _ in projects[:10]:
-            buttons.append([
-                InlineKeyboardButton(text=f"📦 {name}", callback_data=f"upload_to:{pid}")
-            ])
-        buttons.append([InlineKeyboardButton(text="🏠 Home", callback_data="home")])
-        
-        await call.message.edit_text(
-            "<b>📤 Upload File</b>\n\n"
-            "Select a project to upload to:",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
-            parse_mode="HTML"
-        )
-    else:
+    if active_pid:
         # Upload to active project
-        await cb_upload_to(call)
+        await start_upload(call, state, active_pid)
+        return
     
-    await call.answer()
+    if not stats['project_count']:
+        await call.answer(
+            "❌ Create a project first!",
+            show_alert=True
+        )
+        return
+    
+    await show_upload_picker(call, 1)
+    ack(call)
+
+# Projects per page in the upload project picker
+UPLOAD_PICKER_PAGE_SIZE = 10
+
+async def show_upload_picker(call: types.CallbackQuery, page: int):
+    """Show one page of projects to upload to"""
+    projects, page, pages, _ = await db_read(
+        list_project_names_page, call.from_user.id, page, UPLOAD_PICKER_PAGE_SIZE
+    )
+    
+    buttons = [
+        [InlineKeyboardButton(text=f"📦 {name}", callback_data=f"upload_to:{pid}")]
+        for pid, name in projects
+    ]
+    nav = kb_nav_row(page, pages, "upload_page:")
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton(text="🏠 Home", callback_data="home")])
+    
+    await call.message.edit_text(
+        "<b>📤 Upload File</b>\n\n"
+        "Select a project to upload to:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
+        parse_mode="HTML"
+    )
 
-@dp.callback_query(F.data.startswith("upload_to:"))
+@cb_route("upload_page")
+async def cb_upload_page(call: types.CallbackQuery):
+    """Upload project picker pagination"""
+    await show_upload_picker(call, int(call.data.split(":")[1]))
+    ack(call)
+
+@cb_route("upload_to")
 async def cb_upload_to(call: types.CallbackQuery, state: FSMContext):
     """Start upload to specific project"""
-    pid = int(call.data.split(":")[1])
-    
-    project = get_project(call.from_user.id, pid)
+    await start_upload(call, state, int(call.data.split(":")[1]))
+
+async def start_upload(call: types.CallbackQuery, state: FSMContext, pid: int):
+    """Ask for a file to upload into a project"""
+    project = await db_read(get_project, call.from_user.id, pid)
     if not project:
         await call.answer("❌ Project not found", show_alert=True)
         return
@@ -1385,7 +1674,7 @@ async def cb_upload_to(call: types.CallbackQuery, state: FSMContext):
             [InlineKeyboardButton(text="❌ Cancel", callback_data=f"project:{pid}")]
         ])
     )
-    await call.answer()
+    ack(call)
 
 @dp.message(FileUpload.waiting_file, F.document)
 async def handle_file_upload(message: types.Message, state: FSMContext):
@@ -1406,7 +1695,7 @@ async def handle_file_upload(message: types.Message, state: FSMContext):
         return
     
     # Check file limit
-    file_count = count_user_files(message.from_user.id)
+    file_count = await db_read(count_user_files, message.from_user.id)
     if file_count >= limits['files']:
         await message.answer(
             f"❌ File limit reached ({limits['files']})\n"
@@ -1415,6 +1704,7 @@ async def handle_file_upload(message: types.Message, state: FSMContext):
         return
     
     fname = safe_filename(doc.file_name)
+    ftype = get_file_type(fname)
     project_root = get_project_root(message.from_user.id, pid)
     file_path = project_root / fname
     
@@ -1422,15 +1712,14 @@ async def handle_file_upload(message: types.Message, state: FSMContext):
     status_msg = await message.answer("⏳ Uploading...")
     
     try:
-        await bot.download(doc, file_path)
+        # The byte count from the download is the stored size; no stat() needed
+        fsize = await download_document(doc, file_path, status_msg)
         
         # Validate if code file
-        ftype = get_file_type(fname)
-        
-        if ftype in ['py', 'js']:
+        if ftype in CODE_FILE_TYPES:
             await status_msg.edit_text("🔍 Validating code...")
             
-            is_valid, validation_msg = validate_file_on_upload(file_path, ftype)
+            is_valid, validation_msg = await asyncio.to_thread(validate_file_on_upload, file_path, ftype)
             
             if not is_valid:
                 # File has errors
@@ -1455,21 +1744,20 @@ async def handle_file_upload(message: types.Message, state: FSMContext):
             await status_msg.edit_text(
                 f"✅ <b>Upload Complete!</b>\n\n"
                 f"File: <code>{fname}</code>\n"
-                f"Size: {format_bytes(doc.file_size)}",
+                f"Size: {format_bytes(fsize)}",
                 parse_mode="HTML",
                 reply_markup=kb_file_menu(pid, fname)
             )
         
         # Add to database
-        add_file(message.from_user.id, pid, fname, ftype, doc.file_size)
+        await db_write(add_file, message.from_user.id, pid, fname, ftype, fsize)
         stat_increment('total_uploads')
         
         await state.clear()
     
     except Exception as e:
         await status_msg.edit_text(f"❌ Upload failed: {e}")
-        if file_path.exists():
-            file_path.unlink()
+        file_path.unlink(missing_ok=True)
         await state.clear()
 
 # Continue in next part...
@@ -1478,12 +1766,16 @@ async def handle_file_upload(message: types.Message, state: FSMContext):
 # CALLBACK HANDLERS - CONTROL PANEL
 # =============================================================================
 
-@dp.callback_query(F.data.startswith("control:"))
+@cb_route("control")
 async def cb_control(call: types.CallbackQuery):
     """Control panel"""
+    if refresh_too_soon(call):
+        ack(call)
+        return
+    
     pid = int(call.data.split(":")[1])
     
-    project = get_project(call.from_user.id, pid)
+    project = await db_read(get_project, call.from_user.id, pid)
     if not project:
         await call.answer("❌ Project not found", show_alert=True)
         return
@@ -1491,8 +1783,7 @@ async def cb_control(call: types.CallbackQuery):
     _, name, entry, lang, auto_restart, _, _ = project
     
     # Check status
-    key = make_key(call.from_user.id, pid)
-    is_running = key in running_processes and running_processes[key].process.poll() is None
+    is_running = is_project_running(call.from_user.id, pid)
     
     if is_running:
         stats = get_process_stats(call.from_user.id, pid)
@@ -1524,14 +1815,10 @@ async def cb_control(call: types.CallbackQuery):
 └ Auto-restart: <b>{'ON' if auto_restart else 'OFF'}</b>
 """
     
-    await call.message.edit_text(
-        text,
-        reply_markup=kb_control_panel(pid, call.from_user.id),
-        parse_mode="HTML"
-    )
-    await call.answer()
+    await edit_if_changed(call.message, text, kb_control_panel(pid, call.from_user.id))
+    ack(call)
 
-@dp.callback_query(F.data.startswith("start:"))
+@cb_route("start")
 async def cb_start_bot(call: types.CallbackQuery):
     """Start bot"""
     pid = int(call.data.split(":")[1])
@@ -1550,7 +1837,7 @@ async def cb_start_bot(call: types.CallbackQuery):
         await call.message.answer(msg, parse_mode="HTML")
         await cb_control(call)
 
-@dp.callback_query(F.data.startswith("stop:"))
+@cb_route("stop")
 async def cb_stop_bot(call: types.CallbackQuery):
     """Stop bot"""
     pid = int(call.data.split(":")[1])
@@ -1562,14 +1849,14 @@ async def cb_stop_bot(call: types.CallbackQuery):
     await call.answer(msg, show_alert=True)
     await cb_control(call)
 
-@dp.callback_query(F.data.startswith("restart:"))
+@cb_route("restart")
 async def cb_restart_bot(call: types.CallbackQuery):
     """Restart bot"""
     pid = int(call.data.split(":")[1])
     
     await call.answer("⏳ Restarting...", show_alert=False)
     
-    success, msg = restart_process(call.from_user.id, pid)
+    success, msg = await restart_process(call.from_user.id, pid)
     
     if success:
         await call.answer("✅ Restarted successfully", show_alert=True)
@@ -1578,12 +1865,16 @@ async def cb_restart_bot(call: types.CallbackQuery):
     
     await cb_control(call)
 
-@dp.callback_query(F.data.startswith("stats:"))
+@cb_route("stats")
 async def cb_stats(call: types.CallbackQuery):
     """Show detailed statistics"""
+    if refresh_too_soon(call):
+        ack(call)
+        return
+    
     pid = int(call.data.split(":")[1])
     
-    project = get_project(call.from_user.id, pid)
+    project = await db_read(get_project, call.from_user.id, pid)
     if not project:
         await call.answer("❌ Project not found", show_alert=True)
         return
@@ -1591,22 +1882,21 @@ async def cb_stats(call: types.CallbackQuery):
     _, name, entry, lang, auto_restart, _, created = project
     
     # Get stats
-    key = make_key(call.from_user.id, pid)
-    is_running = key in running_processes and running_processes[key].process.poll() is None
+    is_running = is_project_running(call.from_user.id, pid)
     
-    text = f"""
+    parts = [f"""
 <b>📊 Project Statistics</b>
 
 <b>Project:</b> {name}
 <b>ID:</b> <code>{pid}</code>
 <b>Created:</b> {created[:16] if created else 'Unknown'}
 
-"""
+"""]
     
     if is_running:
         stats = get_process_stats(call.from_user.id, pid)
         if stats:
-            text += f"""
+            parts.append(f"""
 <b>Runtime Status:</b>
 ├ Status: {stats['status']}
 ├ PID: <code>{stats['pid']}</code>
@@ -1614,57 +1904,59 @@ async def cb_stats(call: types.CallbackQuery):
 ├ Memory: <b>{stats['memory']}</b>
 ├ Uptime: <b>{stats['uptime']}</b>
 └ Restarts: <b>{stats['restarts']}</b>
-"""
+""")
     else:
-        text += "<b>Status:</b> 🔴 Not running"
+        parts.append("<b>Status:</b> 🔴 Not running")
     
     # File statistics
-    files = list_files(call.from_user.id, pid)
-    total_size = sum(f[2] for f in files)
-    py_count = sum(1 for f in files if f[1] == 'py')
-    js_count = sum(1 for f in files if f[1] == 'js')
+    file_count, total_size, py_count, js_count = await db_read(get_file_aggregates, call.from_user.id, pid)
     
-    text += f"""
+    parts.append(f"""
 
 <b>File Statistics:</b>
-├ Total Files: <b>{len(files)}</b>
+├ Total Files: <b>{file_count}</b>
 ├ Python Files: <b>{py_count}</b>
 ├ JavaScript Files: <b>{js_count}</b>
 └ Total Size: <b>{format_bytes(total_size)}</b>
-"""
+""")
+    text = "".join(parts)
     
-    await call.message.edit_text(
+    await edit_if_changed(
+        call.message,
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+        InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔄 Refresh", callback_data=f"stats:{pid}")],
             [InlineKeyboardButton(text="⬅️ Back", callback_data=f"control:{pid}")]
-        ]),
-        parse_mode="HTML"
+        ])
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("logs:"))
+@cb_route("logs")
 async def cb_logs(call: types.CallbackQuery):
     """Show logs"""
+    if refresh_too_soon(call):
+        ack(call)
+        return
+    
     pid = int(call.data.split(":")[1])
     
-    logs = read_logs(call.from_user.id, pid, lines=50)
+    logs = await asyncio.to_thread(read_logs, call.from_user.id, pid, 50)
     
     if len(logs) > 3500:
         logs = logs[-3500:]
     
-    await call.message.edit_text(
+    await edit_if_changed(
+        call.message,
         f"<b>📝 Logs (last 50 lines)</b>\n\n<pre>{logs}</pre>",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+        InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔄 Refresh", callback_data=f"logs:{pid}")],
             [InlineKeyboardButton(text="⬇️ Download", callback_data=f"download_logs:{pid}")],
             [InlineKeyboardButton(text="⬅️ Back", callback_data=f"control:{pid}")]
-        ]),
-        parse_mode="HTML"
+        ])
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("download_logs:"))
+@cb_route("download_logs", exclusive=True)
 async def cb_download_logs(call: types.CallbackQuery):
     """Download log file"""
     pid = int(call.data.split(":")[1])
@@ -1686,21 +1978,40 @@ async def cb_download_logs(call: types.CallbackQuery):
     except Exception as e:
         await call.message.answer(f"❌ Download failed: {e}")
     
-    await call.answer()
+    ack(call)
 
 # =============================================================================
 # CALLBACK HANDLERS - DEPENDENCIES
 # =============================================================================
 
-@dp.callback_query(F.data.startswith("install_deps:"))
+@lru_cache(maxsize=1024)
+def _count_requirements_at(path: str, mtime_ns: int, size: int) -> int:
+    """Count package lines in a requirements file; keyed on its stat so edits miss"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return sum(1 for line in f if line.strip() and not line.startswith('#'))
+    except (OSError, UnicodeDecodeError):
+        return 0
+
+def count_requirements(req_file: Path) -> Optional[int]:
+    """Number of packages listed in requirements.txt, or None if it is missing"""
+    try:
+        st = req_file.stat()
+    except FileNotFoundError:
+        return None
+    return _count_requirements_at(str(req_file), st.st_mtime_ns, st.st_size)
+
+@cb_route("install_deps")
 async def cb_install_deps(call: types.CallbackQuery):
     """Install dependencies from requirements.txt"""
     pid = int(call.data.split(":")[1])
     
-    project_root = get_project_root(call.from_user.id, pid)
+    project_root = project_root_path(call.from_user.id, pid)
     req_file = project_root / "requirements.txt"
     
-    if not req_file.exists():
+    package_count = await asyncio.to_thread(count_requirements, req_file)
+    
+    if package_count is None:
         await call.message.edit_text(
             "<b>📦 Install Dependencies</b>\n\n"
             "❌ <code>requirements.txt</code> not found.\n\n"
@@ -1719,15 +2030,9 @@ async def cb_install_deps(call: types.CallbackQuery):
                 [InlineKeyboardButton(text="⬅️ Back", callback_data=f"project:{pid}")]
             ])
         )
-        await call.answer()
+        ack(call)
         return
     
-    # Read requirements
-    try:
-        requirements = req_file.read_text(encoding='utf-8')
-        package_count = len([line for line in requirements.split('\n') if line.strip() and not line.startswith('#')])
-    except:
-        package_count = 0
     
     await call.message.edit_text(
         f"<b>📦 Install Dependencies</b>\n\n"
@@ -1741,22 +2046,24 @@ async def cb_install_deps(call: types.CallbackQuery):
         parse_mode="HTML",
         reply_markup=kb_confirm(f"install_deps_confirm:{pid}", f"project:{pid}")
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("install_deps_confirm:"))
+@cb_route("install_deps_confirm", exclusive=True)
 async def cb_install_deps_confirm(call: types.CallbackQuery):
     """Confirm and install dependencies"""
     pid = int(call.data.split(":")[1])
     
+    queued = install_queue_position()
     status_msg = await call.message.edit_text(
         "⏳ <b>Installing Dependencies...</b>\n\n"
-        "This may take several minutes.\n"
+        + (f"Queued behind <b>{queued}</b> other install(s).\n" if queued else "")
+        + "This may take several minutes.\n"
         "Please wait...",
         parse_mode="HTML"
     )
     
     # Install
-    success, msg = install_requirements(call.from_user.id, pid)
+    success, msg = await install_requirements(call.from_user.id, pid)
     
     if success:
         await status_msg.edit_text(
@@ -1776,7 +2083,7 @@ async def cb_install_deps_confirm(call: types.CallbackQuery):
             ])
         )
     
-    await call.answer()
+    ack(call)
 
 # =============================================================================
 # CALLBACK HANDLERS - TEMPLATES
@@ -1785,8 +2092,6 @@ async def cb_install_deps_confirm(call: types.CallbackQuery):
 @dp.callback_query(F.data == "templates")
 async def cb_templates(call: types.CallbackQuery):
     """Templates marketplace"""
-    categories = TEMPLATE_CATEGORIES
-    
     text = """
 <b>🛍️ Template Marketplace</b>
 
@@ -1795,33 +2100,25 @@ Choose a category to browse ready-made templates:
 <b>Available Categories:</b>
 """
     
-    for cat in categories:
-        count = sum(1 for t in TEMPLATES.values() if t['category'] == cat)
-        text += f"\n• <b>{cat}</b> ({count} templates)"
+    for cat in TEMPLATE_CATEGORIES:
+        text += f"\n• <b>{cat}</b> ({len(TEMPLATES_BY_CATEGORY[cat])} templates)"
     
     text += "\n\n💡 Templates are pre-configured projects ready to use!"
     
-    buttons = []
-    for cat in categories:
-        buttons.append([
-            InlineKeyboardButton(text=f"📁 {cat}", callback_data=f"tpl_cat:{cat}")
-        ])
-    buttons.append([InlineKeyboardButton(text="🏠 Home", callback_data="home")])
-    
     await call.message.edit_text(
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
+        reply_markup=kb_templates_menu(),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("tpl_cat:"))
+@cb_route("tpl_cat")
 async def cb_template_category(call: types.CallbackQuery):
     """Show templates in category"""
     category = call.data.split(":", 1)[1]
     
     # Get templates in this category
-    templates = [(tid, t) for tid, t in TEMPLATES.items() if t['category'] == category]
+    templates = TEMPLATES_BY_CATEGORY.get(category, ())
     
     text = f"""
 <b>🛍️ Templates: {category}</b>
@@ -1831,26 +2128,14 @@ Total: <b>{len(templates)}</b> templates
 Select a template to preview:
 """
     
-    buttons = []
-    for tid, t in templates:
-        difficulty_icon = "🟢" if t['difficulty'] == 'Easy' else "🟡" if t['difficulty'] == 'Medium' else "🔴"
-        buttons.append([
-            InlineKeyboardButton(
-                text=f"{difficulty_icon} {t['title']}", 
-                callback_data=f"tpl_view:{tid}"
-            )
-        ])
-    
-    buttons.append([InlineKeyboardButton(text="⬅️ Back", callback_data="templates")])
-    
     await call.message.edit_text(
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
+        reply_markup=kb_template_category(category),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("tpl_view:"))
+@cb_route("tpl_view")
 async def cb_template_view(call: types.CallbackQuery):
     """View template details"""
     tid = call.data.split(":")[1]
@@ -1862,7 +2147,7 @@ async def cb_template_view(call: types.CallbackQuery):
     t = TEMPLATES[tid]
     
     # List files
-    files_list = "\n".join([f"• <code>{fname}</code>" for fname in t['files'].keys()])
+    files_list = "\n".join([f"• <code>{fname}</code>" for fname in t['files']])
     
     text = f"""
 <b>🧩 Template Preview</b>
@@ -1896,9 +2181,9 @@ async def cb_template_view(call: types.CallbackQuery):
         ]),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("tpl_install:"))
+@cb_route("tpl_install", exclusive=True)
 async def cb_template_install(call: types.CallbackQuery, state: FSMContext):
     """Start template installation"""
     tid = call.data.split(":")[1]
@@ -1909,7 +2194,7 @@ async def cb_template_install(call: types.CallbackQuery, state: FSMContext):
     
     # Check project limit
     limits = get_user_limits(call.from_user.id)
-    stats = get_user_stats(call.from_user.id)
+    stats = await db_read(get_user_stats, call.from_user.id)
     
     if stats['project_count'] >= limits['projects']:
         await call.answer(
@@ -1935,7 +2220,19 @@ async def cb_template_install(call: types.CallbackQuery, state: FSMContext):
         parse_mode="HTML",
         reply_markup=kb_back_home()
     )
-    await call.answer()
+    ack(call)
+
+def write_template_files(user_id: int, pid: int, files: dict) -> list:
+    """Write template files into a project; returns [(file_name, file_type, size)]"""
+    project_root = get_project_root(user_id, pid)
+    written = []
+    for fname, content in files.items():
+        file_path = project_root / fname
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        data = content.encode('utf-8')
+        file_path.write_bytes(data)
+        written.append((fname, get_file_type(fname), len(data)))
+    return written
 
 @dp.message(TemplateInstall.project_name)
 async def fsm_template_install(message: types.Message, state: FSMContext):
@@ -1954,21 +2251,17 @@ async def fsm_template_install(message: types.Message, state: FSMContext):
     
     try:
         # Create project
-        pid = create_project(message.from_user.id, name, t['description'])
-        project_root = get_project_root(message.from_user.id, pid)
+        pid = await db_write(create_project, message.from_user.id, name, t['description'])
         
-        # Create all files
-        for fname, content in t['files'].items():
-            file_path = project_root / fname
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-            file_path.write_text(content, encoding='utf-8')
-            
-            ftype = get_file_type(fname)
-            fsize = file_path.stat().st_size
-            add_file(message.from_user.id, pid, fname, ftype, fsize)
+        # Create all files in one worker thread hop
+        written = await asyncio.to_thread(
+            write_template_files, message.from_user.id, pid, template_files(tid)
+        )
+        await db_write(add_files, message.from_user.id, pid, written)
         
         # Update project settings
-        update_project_settings(
+        await db_write(
+            update_project_settings,
             message.from_user.id, 
             pid, 
             t['entry'], 
@@ -2005,12 +2298,68 @@ async def fsm_template_install(message: types.Message, state: FSMContext):
 # CALLBACK HANDLERS - EXPORT
 # =============================================================================
 
-@dp.callback_query(F.data.startswith("export:"))
+# Source/text files are worth a cheap deflate; everything else (images,
+# archives, wheels, .pyc) is stored as-is
+EXPORT_DEFLATE_EXTS = frozenset({
+    '.py', '.js', '.ts', '.json', '.txt', '.md', '.html', '.css',
+    '.yml', '.yaml', '.toml', '.ini', '.cfg', '.env', '.sh', '.csv'
+})
+
+# Directories left out of exports; pruned before they are listed
+EXPORT_SKIP_DIRS = frozenset({'.venv', '__pycache__', '.git', 'node_modules'})
+
+def iter_project_files(root: Path):
+    """Yield (path, arcname) for regular files under root, not following symlinks"""
+    stack = [(str(root), "")]
+    while stack:
+        dir_path, prefix = stack.pop()
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in EXPORT_SKIP_DIRS:
+                        stack.append((entry.path, prefix + entry.name + "/"))
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, prefix + entry.name
+
+def write_project_zip(project_root: Path, fd: int):
+    """Write a ZIP of the project to a file descriptor, closing it when done"""
+    # The descriptor is a pipe, so zipfile streams entries with data descriptors
+    with os.fdopen(fd, 'wb') as out, zipfile.ZipFile(out, 'w', zipfile.ZIP_STORED) as zipf:
+        for path, arcname in iter_project_files(project_root):
+            if os.path.splitext(arcname)[1].lower() in EXPORT_DEFLATE_EXTS:
+                zipf.write(path, arcname, zipfile.ZIP_DEFLATED, 1)
+            else:
+                zipf.write(path, arcname)
+
+class ProjectZipFile(InputFile):
+    """Project ZIP archive built in a worker thread while it is uploaded"""
+    
+    def __init__(self, project_root: Path, filename: str):
+        super().__init__(filename=filename)
+        self.project_root = project_root
+    
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        read_fd, write_fd = os.pipe()
+        writer = asyncio.ensure_future(asyncio.to_thread(write_project_zip, self.project_root, write_fd))
+        # If the upload stops early the writer fails on the closed pipe
+        writer.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            while True:
+                chunk = await asyncio.to_thread(os.read, read_fd, self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            # Surface archive errors instead of sending a truncated file
+            await writer
+        finally:
+            os.close(read_fd)
+
+@cb_route("export", exclusive=True)
 async def cb_export(call: types.CallbackQuery):
     """Export project as ZIP"""
     pid = int(call.data.split(":")[1])
     
-    project = get_project(call.from_user.id, pid)
+    project = await db_read(get_project, call.from_user.id, pid)
     if not project:
         await call.answer("❌ Project not found", show_alert=True)
         return
@@ -2019,91 +2368,39 @@ async def cb_export(call: types.CallbackQuery):
     
     await call.answer("⏳ Creating ZIP archive...", show_alert=False)
     
-    project_root = get_project_root(call.from_user.id, pid)
-    zip_path = LOGS_DIR / f"export_{call.from_user.id}_{pid}.zip"
+    project_root = project_root_path(call.from_user.id, pid)
     
     try:
-        # Create ZIP
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file in project_root.rglob('*'):
-                if file.is_file():
-                    # Skip venv and logs
-                    if '.venv' in file.parts or '__pycache__' in file.parts:
-                        continue
-                    
-                    arcname = file.relative_to(project_root)
-                    zipf.write(file, arcname)
-        
-        # Send ZIP
+        # Stream the ZIP straight into the upload; no temporary file
         await call.message.answer_document(
-            FSInputFile(zip_path, filename=f"{name}.zip"),
+            ProjectZipFile(project_root, filename=f"{name}.zip"),
             caption=f"📦 <b>Project Export</b>\n\n<b>{name}</b>",
             parse_mode="HTML"
         )
         
-        # Clean up
-        zip_path.unlink()
-        
     except Exception as e:
         await call.message.answer(f"❌ Export failed: {e}")
-    
-    await call.answer()
 
 # =============================================================================
 # CALLBACK HANDLERS - FAVORITES
 # =============================================================================
 
-@dp.callback_query(F.data.startswith("fav:"))
+@cb_route("fav")
 async def cb_toggle_favorite(call: types.CallbackQuery):
     """Toggle favorite"""
     parts = call.data.split(":", 2)
     pid = int(parts[1])
     fname = parts[2]
     
-    conn = db_connect()
-    c = conn.cursor()
-    
-    # Check if exists
-    c.execute(
-        "SELECT 1 FROM favorites WHERE user_id=? AND project_id=? AND file_name=?",
-        (call.from_user.id, pid, fname)
-    )
-    
-    if c.fetchone():
-        # Remove
-        c.execute(
-            "DELETE FROM favorites WHERE user_id=? AND project_id=? AND file_name=?",
-            (call.from_user.id, pid, fname)
-        )
-        msg = "Removed from favorites"
-    else:
-        # Add
-        c.execute(
-            "INSERT INTO favorites(user_id, project_id, file_name) VALUES(?, ?, ?)",
-            (call.from_user.id, pid, fname)
-        )
-        msg = "Added to favorites"
-    
-    conn.commit()
-    conn.close()
+    added = await db_write(toggle_favorite, call.from_user.id, pid, fname)
+    msg = "Added to favorites" if added else "Removed from favorites"
     
     await call.answer(f"⭐ {msg}", show_alert=False)
 
 @dp.callback_query(F.data == "favorites")
 async def cb_favorites(call: types.CallbackQuery):
     """Show favorites"""
-    conn = db_connect()
-    c = conn.cursor()
-    c.execute("""
-        SELECT f.project_id, f.file_name, p.name
-        FROM favorites f
-        JOIN projects p ON f.project_id = p.project_id AND f.user_id = p.user_id
-        WHERE f.user_id = ?
-        ORDER BY f.project_id DESC
-        LIMIT 30
-    """, (call.from_user.id,))
-    favorites = c.fetchall()
-    conn.close()
+    favorites = await db_read(list_favorites, call.from_user.id)
     
     if not favorites:
         await call.message.edit_text(
@@ -2113,7 +2410,7 @@ async def cb_favorites(call: types.CallbackQuery):
             parse_mode="HTML",
             reply_markup=kb_back_home()
         )
-        await call.answer()
+        ack(call)
         return
     
     text = f"<b>⭐ Your Favorites</b>\n\nTotal: <b>{len(favorites)}</b>\n\n"
@@ -2134,7 +2431,7 @@ async def cb_favorites(call: types.CallbackQuery):
         reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
 # Continue with Admin Panel in next part...
 
@@ -2149,7 +2446,7 @@ async def cb_admin_panel(call: types.CallbackQuery):
         await call.answer("❌ Admin only!", show_alert=True)
         return
     
-    analytics = get_bot_analytics()
+    analytics = await db_read(get_bot_analytics_cached)
     
     text = f"""
 <b>👑 Admin Panel</b>
@@ -2164,7 +2461,7 @@ async def cb_admin_panel(call: types.CallbackQuery):
 <b>📦 Content:</b>
 ├ Total Projects: <b>{analytics['total_projects']}</b>
 ├ Total Files: <b>{analytics['total_files']}</b>
-└ Running Bots: <b>{len(get_all_running())}</b>
+└ Running Bots: <b>{running_count()}</b>
 
 <b>📈 Activity:</b>
 ├ Total Uploads: <b>{analytics['stats'].get('total_uploads', 0)}</b>
@@ -2178,47 +2475,62 @@ async def cb_admin_panel(call: types.CallbackQuery):
         reply_markup=kb_admin_panel(),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
 # =============================================================================
 # ADMIN PANEL - USERS
 # =============================================================================
 
+# Users per page in the admin users list
+ADMIN_USERS_PAGE_SIZE = 10
+
 @dp.callback_query(F.data == "admin_users")
 async def cb_admin_users(call: types.CallbackQuery):
     """View users list"""
+    await show_admin_users(call, 1)
+
+@cb_route("admin_users_page")
+async def cb_admin_users_page(call: types.CallbackQuery):
+    """Admin users list pagination"""
+    await show_admin_users(call, int(call.data.split(":")[1]))
+
+async def show_admin_users(call: types.CallbackQuery, page: int):
+    """Show one page of users, most recently active first"""
     if not is_admin(call.from_user.id):
         await call.answer("❌ Admin only!", show_alert=True)
         return
     
-    users = get_user_list(limit=20)
+    users, page, pages, total = await db_read(get_user_list_page, page, ADMIN_USERS_PAGE_SIZE)
+    roles = await db_read(get_role_flags_bulk, [row[0] for row in users])
     
-    text = f"<b>👥 Users (Last 20)</b>\n\n"
+    parts = [f"<b>👥 Users</b>\n\nTotal: <b>{total}</b>\n\n"]
     
     for uid, username, full_name, join_date, last_active in users:
+        user_admin, user_premium, user_banned = roles[uid]
         status = []
-        if is_admin(uid):
+        if user_admin:
             status.append("👑")
-        if is_premium(uid):
+        if user_premium:
             status.append("💎")
-        if is_banned(uid):
+        if user_banned:
             status.append("🚫")
         
         status_str = " ".join(status) if status else ""
         
-        text += f"• <code>{uid}</code> {status_str}\n"
-        text += f"  {full_name or 'Unknown'}\n"
-        text += f"  @{username or 'none'}\n\n"
+        parts.append(
+            f"• <code>{uid}</code> {status_str}\n"
+            f"  {full_name or 'Unknown'}\n"
+            f"  @{username or 'none'}\n\n"
+        )
+    
+    text = "".join(parts)
     
     await call.message.edit_text(
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔍 Search User", callback_data="admin_search")],
-            [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
-        ]),
+        reply_markup=kb_admin_users(page, pages),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
 @dp.callback_query(F.data == "admin_search")
 async def cb_admin_search(call: types.CallbackQuery, state: FSMContext):
@@ -2237,18 +2549,16 @@ async def cb_admin_search(call: types.CallbackQuery, state: FSMContext):
         "• <code>@username</code>\n"
         "• <code>John</code>",
         parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Cancel", callback_data="admin_panel")]
-        ])
+        reply_markup=kb_cancel("admin_panel")
     )
-    await call.answer()
+    ack(call)
 
 @dp.message(AdminStates.user_search)
 async def fsm_admin_search(message: types.Message, state: FSMContext):
     """Handle user search"""
     query = message.text.strip().replace("@", "")
     
-    users = search_user(query)
+    users = await db_read(search_user_with_stats, query)
     
     if not users:
         await message.answer(
@@ -2258,27 +2568,30 @@ async def fsm_admin_search(message: types.Message, state: FSMContext):
         await state.clear()
         return
     
-    text = f"<b>🔍 Search Results</b>\n\nFound: <b>{len(users)}</b> users\n\n"
+    parts = [f"<b>🔍 Search Results</b>\n\nFound: <b>{len(users)}</b> users\n\n"]
     
-    for uid, username, full_name, join_date, last_active in users:
-        stats = get_user_stats(uid)
-        
+    for (uid, username, full_name, project_count, file_count,
+         user_admin, user_premium, user_banned) in users:
         status = []
-        if stats['is_admin']:
+        if user_admin:
             status.append("👑 Admin")
-        if stats['is_premium']:
+        if user_premium:
             status.append("💎 Premium")
-        if stats['is_banned']:
+        if user_banned:
             status.append("🚫 Banned")
         
         status_str = " | ".join(status) if status else "Regular"
         
-        text += f"<b>{full_name or 'Unknown'}</b>\n"
-        text += f"├ ID: <code>{uid}</code>\n"
-        text += f"├ Username: @{username or 'none'}\n"
-        text += f"├ Status: {status_str}\n"
-        text += f"├ Projects: {stats['project_count']}\n"
-        text += f"└ Files: {stats['file_count']}\n\n"
+        parts.append(
+            f"<b>{full_name or 'Unknown'}</b>\n"
+            f"├ ID: <code>{uid}</code>\n"
+            f"├ Username: @{username or 'none'}\n"
+            f"├ Status: {status_str}\n"
+            f"├ Projects: {project_count}\n"
+            f"└ Files: {file_count}\n\n"
+        )
+    
+    text = "".join(parts)
     
     await message.answer(
         text,
@@ -2291,55 +2604,79 @@ async def fsm_admin_search(message: types.Message, state: FSMContext):
 # ADMIN PANEL - ANALYTICS
 # =============================================================================
 
-@dp.callback_query(F.data == "admin_analytics")
-async def cb_admin_analytics(call: types.CallbackQuery):
-    """Detailed analytics"""
-    if not is_admin(call.from_user.id):
-        await call.answer("❌ Admin only!", show_alert=True)
-        return
-    
-    analytics = get_bot_analytics()
-    
-    # Calculate percentages
-    premium_pct = (analytics['premium_users'] / analytics['total_users'] * 100) if analytics['total_users'] > 0 else 0
-    active_pct = (analytics['active_24h'] / analytics['total_users'] * 100) if analytics['total_users'] > 0 else 0
-    
-    text = f"""
+# Detailed analytics screen, filled in by render_analytics()
+ANALYTICS_TEXT = """
 <b>📊 Detailed Analytics</b>
 
 <b>👥 Users:</b>
-├ Total: <b>{analytics['total_users']}</b>
-├ Active (24h): <b>{analytics['active_24h']}</b> ({active_pct:.1f}%)
-├ Premium: <b>{analytics['premium_users']}</b> ({premium_pct:.1f}%)
-├ Banned: <b>{analytics['banned_users']}</b>
-└ Admins: <b>{analytics['admins']}</b>
+├ Total: <b>{total_users}</b>
+├ Active (24h): <b>{active_24h}</b> ({active_pct:.1f}%)
+├ Premium: <b>{premium_users}</b> ({premium_pct:.1f}%)
+├ Banned: <b>{banned_users}</b>
+└ Admins: <b>{admins}</b>
 
 <b>📦 Content:</b>
-├ Projects: <b>{analytics['total_projects']}</b>
-├ Files: <b>{analytics['total_files']}</b>
-└ Running: <b>{len(get_all_running())}</b>
+├ Projects: <b>{total_projects}</b>
+├ Files: <b>{total_files}</b>
+└ Running: <b>{running}</b>
 
 <b>📈 Activity Stats:</b>
-├ Uploads: <b>{analytics['stats'].get('total_uploads', 0)}</b>
-├ Downloads: <b>{analytics['stats'].get('total_downloads', 0)}</b>
-├ Bot Runs: <b>{analytics['stats'].get('total_runs', 0)}</b>
-├ Restarts: <b>{analytics['stats'].get('total_restarts', 0)}</b>
-└ Template Installs: <b>{analytics['stats'].get('total_template_installs', 0)}</b>
+├ Uploads: <b>{total_uploads}</b>
+├ Downloads: <b>{total_downloads}</b>
+├ Bot Runs: <b>{total_runs}</b>
+├ Restarts: <b>{total_restarts}</b>
+└ Template Installs: <b>{total_template_installs}</b>
 
 <b>Averages:</b>
-├ Projects per User: <b>{analytics['total_projects'] / analytics['total_users']:.1f}</b>
-└ Files per User: <b>{analytics['total_files'] / analytics['total_users']:.1f}</b>
+├ Projects per User: <b>{projects_per_user:.1f}</b>
+└ Files per User: <b>{files_per_user:.1f}</b>
 """
+
+# Last rendered analytics text with the analytics dict and running count it shows
+_analytics_text: Optional[Tuple[dict, int, str]] = None
+
+def render_analytics(analytics: dict, running: int) -> str:
+    """Render the detailed analytics text, reusing the last render if unchanged"""
+    global _analytics_text
+    cached = _analytics_text
+    if cached and cached[0] is analytics and cached[1] == running:
+        return cached[2]
+    
+    users = max(analytics['total_users'], 1)
+    stats = analytics['stats']
+    text = ANALYTICS_TEXT.format_map({
+        **analytics,
+        'running': running,
+        'active_pct': analytics['active_24h'] / users * 100,
+        'premium_pct': analytics['premium_users'] / users * 100,
+        'projects_per_user': analytics['total_projects'] / users,
+        'files_per_user': analytics['total_files'] / users,
+        'total_uploads': stats.get('total_uploads', 0),
+        'total_downloads': stats.get('total_downloads', 0),
+        'total_runs': stats.get('total_runs', 0),
+        'total_restarts': stats.get('total_restarts', 0),
+        'total_template_installs': stats.get('total_template_installs', 0)
+    })
+    _analytics_text = (analytics, running, text)
+    return text
+
+@dp.callback_query(F.data == "admin_analytics")
+async def cb_admin_analytics(call: types.CallbackQuery):
+    """Detailed analytics"""
+    if not is_admin(call.from_user.id):
+        await call.answer("❌ Admin only!", show_alert=True)
+        return
     
-    await call.message.edit_text(
+    analytics = await db_read(get_bot_analytics_cached)
+    
+    text = render_analytics(analytics, running_count())
+    
+    await edit_if_changed(
+        call.message,
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔄 Refresh", callback_data="admin_analytics")],
-            [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
-        ]),
-        parse_mode="HTML"
+        kb_admin_analytics()
     )
-    await call.answer()
+    ack(call)
 
 # =============================================================================
 # ADMIN PANEL - RUNNING BOTS
@@ -2359,19 +2696,27 @@ async def cb_admin_running(call: types.CallbackQuery):
             "<b>🚀 Running Bots</b>\n\n"
             "No bots are currently running.",
             parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
-            ])
+            reply_markup=kb_admin_back()
         )
-        await call.answer()
+        ack(call)
         return
     
-    text = f"<b>🚀 Running Bots</b>\n\nTotal: <b>{len(running)}</b>\n\n"
+    parts = [f"<b>🚀 Running Bots</b>\n\nTotal: <b>{len(running)}</b>\n\n"]
+    
+    # CPU/RAM for the listed bots, read in one /proc sweep
+    shown = running[:15]
+    usage = read_proc_stats([proc['key'] for proc in shown])
     
     buttons = []
-    for proc in running[:15]:
-        text += f"• User <code>{proc['user_id']}</code> | Project <code>{proc['project_id']}</code>\n"
-        text += f"  PID: <code>{proc['pid']}</code> | Uptime: {proc['uptime']}\n\n"
+    for proc in shown:
+        parts.append(
+            f"• User <code>{proc['user_id']}</code> | Project <code>{proc['project_id']}</code>\n"
+            f"  PID: <code>{proc['pid']}</code> | Uptime: {proc['uptime']}\n"
+        )
+        if proc['key'] in usage:
+            cpu, mem_mb = usage[proc['key']]
+            parts.append(f"  CPU: {cpu:.1f}% | RAM: {mem_mb:.1f} MB\n")
+        parts.append("\n")
         
         buttons.append([
             InlineKeyboardButton(
@@ -2380,32 +2725,43 @@ async def cb_admin_running(call: types.CallbackQuery):
             )
         ])
     
-    buttons.append([InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")])
+    buttons.extend(kb_admin_back().inline_keyboard)
+    
+    text = "".join(parts)
     
     await call.message.edit_text(
         text,
         reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
-@dp.callback_query(F.data.startswith("admin_stop:"))
+@cb_route("admin_stop")
 async def cb_admin_stop(call: types.CallbackQuery):
     """Admin stop bot"""
     if not is_admin(call.from_user.id):
         await call.answer("❌ Admin only!", show_alert=True)
         return
     
-    parts = call.data.split(":")
-    user_id = int(parts[1])
-    project_id = int(parts[2])
+    _, user_id, project_id = call.data.split(":")
+    user_id, project_id = int(user_id), int(project_id)
     
-    success, msg = stop_process(user_id, project_id)
+    success, msg = await asyncio.to_thread(stop_process, user_id, project_id)
     
     await call.answer(msg, show_alert=True)
+    if not success:
+        return
     
-    # Refresh list
-    await cb_admin_running(call)
+    # Only the stopped bot's button changes, so drop that row instead of
+    # re-rendering the whole list; re-render once no stop buttons are left
+    rows = [
+        row for row in call.message.reply_markup.inline_keyboard
+        if row[0].callback_data != call.data
+    ]
+    if any(row[0].callback_data.startswith("admin_stop:") for row in rows):
+        await call.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+    else:
+        await cb_admin_running(call)
 
 # =============================================================================
 # ADMIN PANEL - PREMIUM MANAGEMENT
@@ -2418,26 +2774,23 @@ async def cb_admin_premium(call: types.CallbackQuery):
         await call.answer("❌ Admin only!", show_alert=True)
         return
     
-    premium_users = list_premium()
+    premium_users = await db_read(list_premium)
     
-    text = f"<b>💎 Premium Management</b>\n\n"
-    text += f"Total Premium Users: <b>{len(premium_users)}</b>\n\n"
+    parts = [f"<b>💎 Premium Management</b>\n\nTotal Premium Users: <b>{len(premium_users)}</b>\n\n"]
     
     if premium_users:
-        text += "<b>Active Premium:</b>\n"
+        parts.append("<b>Active Premium:</b>\n")
         for uid, expiry in premium_users[:10]:
-            text += f"• <code>{uid}</code> - Expires: {expiry[:10]}\n"
+            parts.append(f"• <code>{uid}</code> - Expires: {expiry[:10]}\n")
+    
+    text = "".join(parts)
     
     await call.message.edit_text(
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="➕ Add Premium", callback_data="admin_add_premium")],
-            [InlineKeyboardButton(text="➖ Remove Premium", callback_data="admin_remove_premium")],
-            [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
-        ]),
+        reply_markup=kb_admin_premium(),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
 @dp.callback_query(F.data == "admin_add_premium")
 async def cb_admin_add_premium(call: types.CallbackQuery, state: FSMContext):
@@ -2452,11 +2805,9 @@ async def cb_admin_add_premium(call: types.CallbackQuery, state: FSMContext):
         "<b>➕ Add Premium</b>\n\n"
         "Send the user ID:",
         parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Cancel", callback_data="admin_premium")]
-        ])
+        reply_markup=kb_cancel("admin_premium")
     )
-    await call.answer()
+    ack(call)
 
 @dp.message(AdminStates.add_premium_id)
 async def fsm_add_premium_id(message: types.Message, state: FSMContext):
@@ -2492,7 +2843,7 @@ async def fsm_add_premium_days(message: types.Message, state: FSMContext):
     data = await state.get_data()
     user_id = data['user_id']
     
-    success = add_premium(user_id, days, message.from_user.id)
+    success = await db_write(add_premium, user_id, days, message.from_user.id)
     
     if success:
         await message.answer(
@@ -2523,11 +2874,9 @@ async def cb_admin_remove_premium(call: types.CallbackQuery, state: FSMContext):
         "<b>➖ Remove Premium</b>\n\n"
         "Send the user ID:",
         parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Cancel", callback_data="admin_premium")]
-        ])
+        reply_markup=kb_cancel("admin_premium")
     )
-    await call.answer()
+    ack(call)
 
 @dp.message(AdminStates.remove_premium_id)
 async def fsm_remove_premium(message: types.Message, state: FSMContext):
@@ -2539,7 +2888,7 @@ async def fsm_remove_premium(message: types.Message, state: FSMContext):
         await state.clear()
         return
     
-    success = remove_premium(user_id)
+    success = await db_write(remove_premium, user_id)
     
     if success:
         await message.answer(
@@ -2566,27 +2915,26 @@ async def cb_admin_ban_menu(call: types.CallbackQuery):
         await call.answer("❌ Admin only!", show_alert=True)
         return
     
-    banned = list_banned()
+    banned = await db_read(list_banned)
     
-    text = f"<b>🚫 Ban Management</b>\n\n"
-    text += f"Total Banned: <b>{len(banned)}</b>\n\n"
+    parts = [f"<b>🚫 Ban Management</b>\n\nTotal Banned: <b>{len(banned)}</b>\n\n"]
     
     if banned:
-        text += "<b>Banned Users:</b>\n"
+        parts.append("<b>Banned Users:</b>\n")
         for uid, banned_date, reason in banned[:10]:
-            text += f"• <code>{uid}</code>\n"
-            text += f"  Reason: <i>{reason or 'No reason'}</i>\n\n"
+            parts.append(
+                f"• <code>{uid}</code>\n"
+                f"  Reason: <i>{reason or 'No reason'}</i>\n\n"
+            )
+    
+    text = "".join(parts)
     
     await call.message.edit_text(
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🚫 Ban User", callback_data="admin_ban_user")],
-            [InlineKeyboardButton(text="✅ Unban User", callback_data="admin_unban_user")],
-            [InlineKeyboardButton(text="⬅️ Back", callback_data="admin_panel")]
-        ]),
+        reply_markup=kb_admin_ban(),
         parse_mode="HTML"
     )
-    await call.answer()
+    ack(call)
 
 @dp.callback_query(F.data == "admin_ban_user")
 async def cb_admin_ban_user(call: types.CallbackQuery, state: FSMContext):
@@ -2601,11 +2949,9 @@ async def cb_admin_ban_user(call: types.CallbackQuery, state: FSMContext):
         "<b>🚫 Ban User</b>\n\n"
         "Send the user ID to ban:",
         parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Cancel", callback_data="admin_ban")]
-        ])
+        reply_markup=kb_cancel("admin_ban")
     )
-    await call.answer()
+    ack(call)
 
 @dp.message(AdminStates.ban_user_id)
 async def fsm_ban_user_id(message: types.Message, state: FSMContext):
@@ -2641,7 +2987,7 @@ async def fsm_ban_reason(message: types.Message, state: FSMContext):
     data = await state.get_data()
     user_id = data['user_id']
     
-    success = ban_user(user_id, reason, message.from_user.id)
+    success = await db_write(ban_user, user_id, reason, message.from_user.id)
     
     if success:
         await message.answer(
@@ -2672,11 +3018,9 @@ async def cb_admin_unban_user(call: types.CallbackQuery, state: FSMContext):
         "<b>✅ Unban User</b>\n\n"
         "Send the user ID to unban:",
         parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Cancel", callback_data="admin_ban")]
-        ])
+        reply_markup=kb_cancel("admin_ban")
     )
-    await call.answer()
+    ack(call)
 
 @dp.message(AdminStates.unban_user_id)
 async def fsm_unban_user(message: types.Message, state: FSMContext):
@@ -2688,7 +3032,7 @@ async def fsm_unban_user(message: types.Message, state: FSMContext):
         await state.clear()
         return
     
-    success = unban_user(user_id)
+    success = await db_write(unban_user, user_id)
     
     if success:
         await message.answer(
@@ -2724,11 +3068,9 @@ async def cb_admin_broadcast(call: types.CallbackQuery, state: FSMContext):
         "• <code>premium</code> - Premium users only\n"
         "• <code>active</code> - Active users (24h)",
         parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Cancel", callback_data="admin_panel")]
-        ])
+        reply_markup=kb_cancel("admin_panel")
     )
-    await call.answer()
+    ack(call)
 
 @dp.message(AdminStates.broadcast_target)
 async def fsm_broadcast_target(message: types.Message, state: FSMContext):
@@ -2771,7 +3113,10 @@ async def fsm_broadcast_message(message: types.Message, state: FSMContext):
     
     status_msg = await message.answer("⏳ Broadcasting...")
     
-    success_count, fail_count = await broadcast_message(bot, msg_text, target)
+    async def report_progress(sent: int, failed: int):
+        await status_msg.edit_text(f"⏳ Broadcasting...\n\n✅ {sent}  ❌ {failed}")
+    
+    success_count, fail_count = await broadcast_message(bot, msg_text, target, on_progress=report_progress)
     
     await status_msg.edit_text(
         f"✅ <b>Broadcast Complete!</b>\n\n"
@@ -2795,18 +3140,26 @@ async def webserver():
         return web.Response(text="Bot is running! ✅")
     
     async def stats(request):
-        analytics = get_bot_analytics()
+        analytics = await db_read(get_bot_analytics_cached)
         return web.json_response({
             'status': 'ok',
             'users': analytics['total_users'],
             'projects': analytics['total_projects'],
-            'running_bots': len(get_all_running())
+            'running_bots': running_count()
         })
     
     app = web.Application()
     app.router.add_get('/', health_check)
     app.router.add_get('/stats', stats)
     
+    # Telegram updates, when running in webhook mode
+    if WEBHOOK_URL:
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=WEBHOOK_SECRET or None
+        ).register(app, path=WEBHOOK_PATH)
+    
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', WEB_SERVER_PORT)
@@ -2845,6 +3198,13 @@ async def main():
     asyncio.create_task(auto_restart_monitor())
     logger.info("✅ Auto-restart monitor started")
     
+    # Start statistics and user activity flushers
+    stats_task = asyncio.create_task(stats_flush_loop())
+    users_task = asyncio.create_task(users_flush_loop())
+    
+    # Start callback acknowledger
+    ack_task = asyncio.create_task(ack_worker())
+    
     # Log bot info
     me = await bot.get_me()
     logger.info(f"✅ Bot started: @{me.username}")
@@ -2852,25 +3212,63 @@ async def main():
     logger.info(f"✅ Database: {DB_PATH}")
     logger.info(f"✅ Users directory: {USERS_DIR}")
     logger.info("=" * 60)
-    logger.info("📡 Polling started...")
     
-    # Start polling
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if WEBHOOK_URL:
+            # Updates are fed to the dispatcher by the web server
+            await bot.set_webhook(
+                WEBHOOK_URL + WEBHOOK_PATH,
+                allowed_updates=dp.resolve_used_update_types(),
+                secret_token=WEBHOOK_SECRET or None
+            )
+            logger.info("📡 Webhook set, waiting for updates...")
+            
+            # Polling handles SIGTERM/SIGINT itself; here they must end the
+            # wait so the cleanup below still runs
+            stop = asyncio.Event()
+            if os.name != 'nt':
+                loop = asyncio.get_running_loop()
+                for sig in (signal.SIGTERM, signal.SIGINT):
+                    loop.add_signal_handler(sig, stop.set)
+            await stop.wait()
+        else:
+            # getUpdates is refused while a webhook from an earlier run is set
+            await bot.delete_webhook()
+            logger.info("📡 Polling started...")
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
         # Cleanup on exit
         logger.info("\n⚠️ Stopping bot...")
         
-        # Stop all running processes
-        for key in list(running_processes.keys()):
-            stop_process(*map(int, key.split(":")))
+        # Stop all running processes; each may wait up to 10s for its
+        # process to exit, so they are stopped side by side
+        await asyncio.gather(
+            *(asyncio.to_thread(stop_process, *map(int, key.split(":")))
+              for key in list(running_processes.keys())),
+            return_exceptions=True
+        )
+        
+        # Write any buffered statistics and user activity
+        stats_task.cancel()
+        users_task.cancel()
+        ack_task.cancel()
+        # A failed final flush must not skip the rest of the cleanup
+        for flush in (flush_stats, flush_users):
+            try:
+                flush()
+            except sqlite3.Error as e:
+                logger.error("Final %s failed: %s", flush.__name__, e)
+        node_checker.close()
         
         await bot.session.close()
         logger.info("✅ Bot stopped gracefully")
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if uvloop:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("\n✅ Bot stopped by user")
     except Exception as e:
@@ -0,0 +1,28 @@
+# Telegram Echo Bot
+import asyncio
+from aiogram import Bot, Dispatcher, types, F
+from aiogram.filters import CommandStart
+
+TOKEN = "YOUR_BOT_TOKEN_HERE"
+
+bot = Bot(token=TOKEN)
+dp = Dispatcher()
+
+@dp.message(CommandStart())
+async def cmd_start(message: types.Message):
+    await message.answer(
+        "👋 <b>Hello!</b>\n\n"
+        "I'm an echo bot. Send me any text and I'll repeat it!",
+        parse_mode="HTML"
+    )
+
+@dp.message(F.text)
+async def echo_handler(message: types.Message):
+    await message.answer(message.text)
+
+async def main():
+    print("🚀 Bot started!")
+    await dp.start_polling(bot)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+# Telegram Menu Bot with FSM
+import asyncio
+from aiogram import Bot, Dispatcher, types, F
+from aiogram.filters import CommandStart
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+TOKEN = "YOUR_BOT_TOKEN_HERE"
+
+bot = Bot(token=TOKEN)
+dp = Dispatcher(storage=MemoryStorage())
+
+class Form(StatesGroup):
+    name = State()
+    age = State()
+
+def main_menu():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="ℹ️ About", callback_data="about")],
+        [InlineKeyboardButton(text="📝 Register", callback_data="register")],
+        [InlineKeyboardButton(text="❓ Help", callback_data="help")]
+    ])
+
+@dp.message(CommandStart())
+async def cmd_start(message: types.Message):
+    await message.answer(
+        "🎉 <b>Welcome to Menu Bot!</b>\n\n"
+        "Choose an option from the menu:",
+        reply_markup=main_menu(),
+        parse_mode="HTML"
+    )
+
+@dp.callback_query(F.data == "about")
+async def about_callback(call: types.CallbackQuery):
+    await call.message.edit_text(
+        "ℹ️ <b>About This Bot</b>\n\n"
+        "This is a demo menu bot with FSM support.",
+        reply_markup=main_menu(),
+        parse_mode="HTML"
+    )
+    await call.answer()
+
+@dp.callback_query(F.data == "register")
+async def register_callback(call: types.CallbackQuery, state: FSMContext):
+    await state.set_state(Form.name)
+    await call.message.edit_text("📝 Please send your name:")
+    await call.answer()
+
+@dp.message(Form.name)
+async def process_name(message: types.Message, state: FSMContext):
+    await state.update_data(name=message.text)
+    await state.set_state(Form.age)
+    await message.answer("📅 Now send your age:")
+
+@dp.message(Form.age)
+async def process_age(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    await message.answer(
+        f"✅ <b>Registration Complete!</b>\n\n"
+        f"Name: {data['name']}\n"
+        f"Age: {message.text}",
+        reply_markup=main_menu(),
+        parse_mode="HTML"
+    )
+
+@dp.callback_query(F.data == "help")
+async def help_callback(call: types.CallbackQuery):
+    await call.message.edit_text(
+        "❓ <b>Help</b>\n\n"
+        "Use /start to open the menu.\n"
+        "Click buttons to navigate.",
+        reply_markup=main_menu(),
+        parse_mode="HTML"
+    )
+    await call.answer()
+
+async def main():
+    print("🚀 Menu bot started!")
+    await dp.start_polling(bot)
+
+if __name__ == "__main__":
+    asyncio.run(main())
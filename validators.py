@@ -5,28 +5,191 @@ Code validation and syntax checking
 
 import ast
 import sys
+import html
+import json
+import hashlib
+import queue
 import subprocess
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional, NamedTuple
 
-class CodeValidator:
-    """Validates Python and JavaScript code for syntax errors"""
+# Top-level names of the standard library, for splitting imports
+STDLIB_MODULES = frozenset(sys.stdlib_module_names)
+
+# =============================================================================
+# NODE SYNTAX CHECKER
+# =============================================================================
+
+# Seconds to wait for the node checker to answer one file
+NODE_CHECK_TIMEOUT = 5
+
+# Node program that reads one JSON-encoded path per stdin line and answers
+# with one JSON line, so a single node process serves every upload. Files
+# are compiled as CommonJS first, then as an ES module, like node --check.
+_NODE_CHECKER_JS = r"""
+const fs = require('fs');
+const vm = require('vm');
+const CJS_PARAMS = ['exports', 'require', 'module', '__filename', '__dirname'];
+require('readline').createInterface({ input: process.stdin }).on('line', (line) => {
+    const file = JSON.parse(line);
+    let reply;
+    try {
+        const code = fs.readFileSync(file, 'utf8');
+        try {
+            vm.compileFunction(code, CJS_PARAMS, { filename: file });
+            reply = { ok: true };
+        } catch (err) {
+            try {
+                new vm.SourceTextModule(code, { identifier: file });
+                reply = { ok: true };
+            } catch (_) {
+                reply = { ok: false, error: String(err.stack).split('\n    at ')[0] };
+            }
+        }
+    } catch (err) {
+        reply = { ok: false, error: String(err.message) };
+    }
+    process.stdout.write(JSON.stringify(reply) + '\n');
+});
+"""
+
+class NodeChecker:
+    """Long-lived node process for JavaScript syntax checks, respawned if it dies"""
+    
+    def __init__(self):
+        self._proc: Optional[subprocess.Popen] = None
+        self._replies: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+    
+    def _ensure_running(self) -> subprocess.Popen:
+        """Start the node process unless it is already running"""
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ['node', '--experimental-vm-modules', '-e', _NODE_CHECKER_JS],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding='utf-8'
+            )
+            # Replies are read on a thread so waiting for one can time out
+            # on every OS (select() does not work on Windows pipes)
+            self._replies = queue.Queue()
+            threading.Thread(
+                target=self._read_replies,
+                args=(self._proc.stdout, self._replies),
+                daemon=True
+            ).start()
+        return self._proc
     
     @staticmethod
-    def validate_python(file_path: Path) -> Tuple[bool, str, List[Dict]]:
+    def _read_replies(stdout, replies: "queue.Queue[str]"):
+        """Forward reply lines to the queue; an empty string marks the end of output"""
+        try:
+            for line in stdout:
+                replies.put(line)
+        except (OSError, ValueError):
+            pass
+        replies.put("")
+    
+    def check(self, file_path: Path) -> Tuple[bool, str]:
         """
-        Validate Python file syntax
+        Syntax-check one file
         
         Returns:
-            (is_valid, message, errors_list)
+            (is_valid, error_text)
         """
+        with self._lock:
+            # A process that died since the last check is replaced once
+            for _ in range(2):
+                proc = self._ensure_running()
+                try:
+                    proc.stdin.write(json.dumps(str(file_path)) + "\n")
+                    proc.stdin.flush()
+                    line = self._replies.get(timeout=NODE_CHECK_TIMEOUT)
+                except OSError:
+                    line = ""
+                except queue.Empty:
+                    line = None
+                
+                if line:
+                    break
+                
+                proc.kill()
+                proc.wait()
+                self._proc = None
+                if line is None:
+                    raise TimeoutError("Node.js syntax check timed out")
+            else:
+                raise RuntimeError("Node.js syntax checker exited")
+        
+        reply = json.loads(line)
+        return reply['ok'], reply.get('error', '')
+    
+    def close(self):
+        """Stop the node process"""
+        with self._lock:
+            if self._proc is not None:
+                self._proc.kill()
+                self._proc = None
+
+node_checker = NodeChecker()
+
+# =============================================================================
+# PYTHON VALIDATION CACHE
+# =============================================================================
+
+# Python analyses kept by SHA-256 of the file content, so re-uploading or
+# re-checking the same file skips the parse
+PYTHON_CACHE_SIZE = 2048
+
+_python_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+_python_cache_lock = threading.Lock()
+
+def _python_cache_get(digest: bytes) -> Optional[tuple]:
+    """Get a cached result and mark it recently used"""
+    with _python_cache_lock:
+        result = _python_cache.get(digest)
+        if result is not None:
+            _python_cache.move_to_end(digest)
+        return result
+
+def _python_cache_put(digest: bytes, result: tuple) -> tuple:
+    """Store a result, evicting the least recently used one"""
+    with _python_cache_lock:
+        _python_cache[digest] = result
+        if len(_python_cache) > PYTHON_CACHE_SIZE:
+            _python_cache.popitem(last=False)
+    return result
+
+class PythonAnalysis(NamedTuple):
+    """Syntax check and imports of one Python file"""
+    is_valid: bool
+    message: str
+    errors: List[Dict]
+    stdlib_imports: List[str]
+    external_imports: List[str]
+
+class CodeValidator:
+    """Validates Python and JavaScript code for syntax errors"""
+    
+    @staticmethod
+    def analyze_python(file_path: Path) -> PythonAnalysis:
+        """Check Python syntax and collect imports with one read and one parse"""
         try:
-            code = file_path.read_text(encoding='utf-8', errors='replace')
+            data = file_path.read_bytes()
+            digest = hashlib.sha256(data).digest()
+            cached = _python_cache_get(digest)
+            if cached is not None:
+                return cached
+            
+            code = data.decode('utf-8', errors='replace')
             
             # Try to parse with ast
             try:
-                ast.parse(code)
-                return True, "✅ No syntax errors found!", []
+                tree = ast.parse(code)
             
             except SyntaxError as e:
                 error_info = {
@@ -44,10 +207,26 @@ class CodeValidator:
                     f"💡 <i>Fix this error before running your bot.</i>"
                 )
                 
-                return False, error_msg, [error_info]
+                return _python_cache_put(digest, PythonAnalysis(False, error_msg, [error_info], [], []))
+            
+            stdlib_imports, external_imports = CodeValidator._collect_imports(tree)
+            return _python_cache_put(digest, PythonAnalysis(
+                True, "✅ No syntax errors found!", [], stdlib_imports, external_imports
+            ))
                 
         except Exception as e:
-            return False, f"❌ Validation error: {str(e)}", []
+            return PythonAnalysis(False, f"❌ Validation error: {str(e)}", [], [], [])
+    
+    @staticmethod
+    def validate_python(file_path: Path) -> Tuple[bool, str, List[Dict]]:
+        """
+        Validate Python file syntax
+        
+        Returns:
+            (is_valid, message, errors_list)
+        """
+        analysis = CodeValidator.analyze_python(file_path)
+        return analysis.is_valid, analysis.message, analysis.errors
     
     @staticmethod
     def validate_javascript(file_path: Path) -> Tuple[bool, str, List[Dict]]:
@@ -58,20 +237,15 @@ class CodeValidator:
             (is_valid, message, errors_list)
         """
         try:
-            # Try to check syntax using node
-            result = subprocess.run(
-                ['node', '--check', str(file_path)],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
+            # Check syntax in the shared node process
+            ok, error = node_checker.check(file_path)
             
-            if result.returncode == 0:
+            if ok:
                 return True, "✅ No syntax errors found!", []
             else:
                 error_msg = (
                     f"❌ <b>Syntax Error Found!</b>\n\n"
-                    f"<code>{result.stderr}</code>\n\n"
+                    f"<code>{html.escape(error)}</code>\n\n"
                     f"💡 <i>Fix this error before running your bot.</i>"
                 )
                 return False, error_msg, []
@@ -89,36 +263,33 @@ class CodeValidator:
         Returns:
             (stdlib_imports, external_imports)
         """
-        stdlib_modules = set(sys.stdlib_module_names)
+        analysis = CodeValidator.analyze_python(file_path)
+        return analysis.stdlib_imports, analysis.external_imports
+    
+    @staticmethod
+    def _collect_imports(tree: ast.AST) -> Tuple[List[str], List[str]]:
+        """Split the top-level modules imported in a parsed file into stdlib and external"""
+        stdlib_imports = set()
+        external_imports = set()
         
-        try:
-            code = file_path.read_text(encoding='utf-8', errors='replace')
-            tree = ast.parse(code)
-            
-            stdlib_imports = []
-            external_imports = []
-            
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        module = alias.name.split('.')[0]
-                        if module in stdlib_modules:
-                            stdlib_imports.append(module)
-                        else:
-                            external_imports.append(module)
-                            
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module:
-                        module = node.module.split('.')[0]
-                        if module in stdlib_modules:
-                            stdlib_imports.append(module)
-                        else:
-                            external_imports.append(module)
-            
-            return list(set(stdlib_imports)), list(set(external_imports))
-            
-        except Exception:
-            return [], []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    module = alias.name.split('.')[0]
+                    if module in STDLIB_MODULES:
+                        stdlib_imports.add(module)
+                    else:
+                        external_imports.add(module)
+                        
+            elif isinstance(node, ast.ImportFrom):
+                if node.module:
+                    module = node.module.split('.')[0]
+                    if module in STDLIB_MODULES:
+                        stdlib_imports.add(module)
+                    else:
+                        external_imports.add(module)
+        
+        return sorted(stdlib_imports), sorted(external_imports)
     
     @staticmethod
     def suggest_requirements(external_imports: List[str]) -> str:
@@ -165,11 +336,13 @@ def validate_file_on_upload(file_path: Path, file_type: str) -> Tuple[bool, str]
     validator = CodeValidator()
     
     if file_type == 'py':
-        is_valid, message, errors = validator.validate_python(file_path)
+        # Syntax and imports come from the same parse
+        analysis = validator.analyze_python(file_path)
+        is_valid, message = analysis.is_valid, analysis.message
         
-        # Also check imports and suggest requirements
+        # Suggest requirements for the external imports
         if is_valid:
-            stdlib, external = validator.check_imports(file_path)
+            external = analysis.external_imports
             if external:
                 suggestions = validator.suggest_requirements(external)
                 message += (
@@ -182,7 +355,8 @@ def validate_file_on_upload(file_path: Path, file_type: str) -> Tuple[bool, str]
         return is_valid, message
     
     elif file_type == 'js':
-        return validator.validate_javascript(file_path)
+        is_valid, message, errors = validator.validate_javascript(file_path)
+        return is_valid, message
     
     else:
         return True, "✅ File uploaded successfully"
\ No newline at end of file